@@ -0,0 +1,257 @@
+"""
+Воспроизводимый нагрузочный бенчмарк пути отдачи моков.
+
+Поднимает src.main:app внутри процесса на SQLite (aiosqlite) и mongomock,
+заполняет N пользователей x M групп x K эндпоинтов и нагружает конкурентными
+асинхронными клиентами /api/{user}/{group}/{path}, /group/{id} и POST /endpoint/.
+Результат - JSON с пропускной способностью и задержками p50/p95/p99 по сценариям.
+
+Запуск из корня репозитория:
+
+    pip install -r requirements.txt -r benchmarks/requirements.txt
+    python -m benchmarks.run --requests 2000 --concurrency 32 --output bench.json
+    python -m benchmarks.run --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List
+
+
+def configure_environment(workdir: str) -> None:
+    # Настройки читаются при импорте src.config, поэтому задаются до импорта приложения
+    os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{workdir}/bench.db")
+    os.environ.setdefault("MONGO_HOST", "localhost")
+    os.environ.setdefault("MONGO_PORT", "27017")
+    os.environ.setdefault("MONGO_BASE", "mock_bench")
+    os.environ.setdefault("SECRET_AUTH", "benchmark-secret")
+
+
+async def create_schema() -> None:
+    from sqlalchemy import insert
+
+    from src.auth.models import metadata as auth_metadata, role
+    from src.database import engine
+    from src.endpoints.models import metadata as endpoint_metadata
+    from src.groups.models import metadata as groups_metadata
+
+    async with engine.begin() as conn:
+        for metadata in (auth_metadata, groups_metadata, endpoint_metadata):
+            await conn.run_sync(metadata.create_all)
+        await conn.execute(insert(role).values(id=1, name="user", permissions=None))
+
+
+def make_payload(items: int) -> List[Dict]:
+    return [{"id": i, "name": f"item-{i}", "price": i * 1.5, "tags": ["a", "b", "c"]} for i in range(items)]
+
+
+async def seed(client, args) -> Dict:
+    state = {"users": [], "routes": [], "groups": []}
+    payload = json.dumps(make_payload(args.payload_items))
+
+    for u in range(args.users):
+        username = f"bench{u}"
+        email = f"{username}@example.com"
+        response = await client.post("/auth/register", json={
+            "username": username, "email": email, "password": "benchmark", "role_id": 1
+        })
+        response.raise_for_status()
+        response = await client.post("/auth/jwt/login", data={"username": email, "password": "benchmark"})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        state["users"].append({"username": username, "headers": headers})
+
+        for g in range(args.groups):
+            group_endpoint = f"group{g}"
+            response = await client.post("/group/", headers=headers, json={
+                "name": f"Group {g}", "endpoint": group_endpoint, "description": "benchmark"
+            })
+            response.raise_for_status()
+
+            for e in range(args.endpoints):
+                path = f"resource{e}"
+                response = await client.post("/endpoint/", headers=headers, json={
+                    "path": path, "method": "GET", "json_data": payload, "group_name": group_endpoint
+                })
+                response.raise_for_status()
+                state["routes"].append(f"/api/{username}/{group_endpoint}/{path}")
+
+        response = await client.get("/group/", headers=headers)
+        response.raise_for_status()
+        state["groups"].extend((headers, row["id"]) for row in response.json())
+
+    return state
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(make_request: Callable[[int], Awaitable[int]], requests: int,
+                       concurrency: int, warmup: int) -> Dict:
+    for i in range(warmup):
+        await make_request(i)
+
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            status = await make_request(warmup + i)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(requests / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+async def benchmark(args) -> Dict:
+    import httpx
+
+    from benchmarks.standins import install_in_process_mongo
+    from src.main import app
+    from src.mocks.cache import route_cache
+    from src.mongo import mongo_manager
+
+    install_in_process_mongo(mongo_manager)
+    await create_schema()
+
+    rng = random.Random(args.seed)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            state = await seed(client, args)
+            routes = state["routes"]
+
+            async def api_get(i):
+                return (await client.get(rng.choice(routes))).status_code
+
+            async def group_detail(i):
+                headers, group_id = rng.choice(state["groups"])
+                return (await client.get(f"/group/{group_id}", params={"group_id": group_id},
+                                         headers=headers)).status_code
+
+            payload = json.dumps(make_payload(args.payload_items))
+
+            async def endpoint_create(i):
+                headers = state["users"][i % len(state["users"])]["headers"]
+                return (await client.post("/endpoint/", headers=headers, json={
+                    "path": f"created{i}", "method": "GET", "json_data": payload, "group_name": "group0"
+                })).status_code
+
+            results["api_get_cached"] = await run_scenario(api_get, args.requests, args.concurrency, args.warmup)
+
+            # Тот же трафик без кэша маршрутов: разрешение через таблицу маршрутов и чтение из MongoDB
+            cache_size = route_cache.maxsize
+            route_cache.maxsize = 0
+            route_cache.clear()
+            results["api_get_uncached"] = await run_scenario(api_get, args.requests, args.concurrency, args.warmup)
+            route_cache.maxsize = cache_size
+
+            results["group_detail"] = await run_scenario(group_detail, args.requests, args.concurrency,
+                                                         args.warmup)
+            results["endpoint_create"] = await run_scenario(endpoint_create, args.create_requests,
+                                                            args.concurrency, 0)
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(baseline: Dict, current: Dict) -> None:
+    print(f"{'scenario':<20}{'rps':>24}{'p50 ms':>24}{'p99 ms':>24}")
+    for name, result in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        cells = []
+        for old, new in ((base["throughput_rps"], result["throughput_rps"]),
+                         (base["latency_ms"]["p50"], result["latency_ms"]["p50"]),
+                         (base["latency_ms"]["p99"], result["latency_ms"]["p99"])):
+            change = (new - old) / old * 100 if old else 0.0
+            cells.append(f"{old:.2f} -> {new:.2f} ({change:+.1f}%)")
+        print(f"{name:<20}" + "".join(f"{cell:>24}" for cell in cells))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк пути отдачи моков")
+    parser.add_argument("--users", type=int, default=2)
+    parser.add_argument("--groups", type=int, default=3)
+    parser.add_argument("--endpoints", type=int, default=10)
+    parser.add_argument("--payload-items", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--create-requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Файл для JSON-результата (по умолчанию stdout)")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для сравнения")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(workdir)
+        scenarios = asyncio.run(benchmark(args))
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "scenarios": scenarios,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
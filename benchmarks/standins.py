@@ -0,0 +1,108 @@
+"""
+Локальные заменители внешних сервисов для бенчмарков.
+
+Postgres заменяется файлом SQLite через aiosqlite (DATABASE_URL), MongoDB -
+mongomock внутри процесса, обернутым в асинхронный интерфейс AsyncMongoClient.
+"""
+import asyncio
+from typing import Any
+
+import mongomock
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import OperationFailure
+
+
+class _AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: int = None):
+        return list(self._cursor) if length is None else [item for _, item in zip(range(length), self._cursor)]
+
+
+class _AsyncProxy:
+    """Оборачивает объекты mongomock так, чтобы их методы можно было await-ить"""
+
+    # Методы, которые в асинхронном pymongo возвращают курсор без await
+    CURSOR_METHODS = {"find", "list_indexes"}
+    # Методы, которые возвращают курсор через await
+    ASYNC_CURSOR_METHODS = {"aggregate"}
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getitem__(self, name: str):
+        return _AsyncProxy(self._target[name])
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if isinstance(attr, (mongomock.Database, mongomock.Collection)):
+            return _AsyncProxy(attr)
+        if not callable(attr):
+            return attr
+        if name in self.CURSOR_METHODS:
+            return lambda *args, **kwargs: _AsyncCursor(iter(attr(*args, **kwargs)))
+        if name == "bulk_write":
+            return self._bulk_write
+
+        async def call(*args, **kwargs):
+            # Отдаем управление циклу, как это сделал бы сетевой вызов
+            await asyncio.sleep(0)
+            if name in self.ASYNC_CURSOR_METHODS:
+                try:
+                    return _AsyncCursor(iter(attr(*args, **kwargs)))
+                except NotImplementedError as e:
+                    # Неподдерживаемый mongomock оператор сервер отклонил бы так же, как неизвестный
+                    raise OperationFailure(str(e))
+            result = attr(*args, **kwargs)
+            if isinstance(result, (mongomock.Database, mongomock.Collection)):
+                return _AsyncProxy(result)
+            return result
+
+        return call
+
+    async def _bulk_write(self, operations, ordered: bool = True):
+        # mongomock не принимает операции текущего pymongo: выполняем их по одной
+        await asyncio.sleep(0)
+        for operation in operations:
+            if isinstance(operation, UpdateOne):
+                self._target.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+            elif isinstance(operation, UpdateMany):
+                self._target.update_many(operation._filter, operation._doc, upsert=operation._upsert)
+            elif isinstance(operation, ReplaceOne):
+                self._target.replace_one(operation._filter, operation._doc, upsert=operation._upsert)
+            elif isinstance(operation, InsertOne):
+                self._target.insert_one(operation._doc)
+            elif isinstance(operation, DeleteOne):
+                self._target.delete_one(operation._filter)
+            elif isinstance(operation, DeleteMany):
+                self._target.delete_many(operation._filter)
+            else:
+                raise TypeError(f"Неизвестная операция bulk_write: {type(operation).__name__}")
+
+
+def install_in_process_mongo(manager) -> None:
+    """Подменяет подключение AsyncMongoManager на mongomock внутри процесса"""
+    client = mongomock.MongoClient()
+
+    async def connect() -> bool:
+        manager.client = _AsyncProxy(client)
+        manager.db = manager.client[manager.database_name]
+        return True
+
+    async def disconnect() -> None:
+        client.close()
+        manager.client = None
+        manager.db = None
+
+    manager.connect = connect
+    manager.disconnect = disconnect
@@ -6,4 +6,8 @@ alembic upgrade head
 
 python -m src.script_db
 
+# Воркеры выгружают метрики в общий каталог, /metrics любого воркера отдает метрики всех
+export METRICS_MULTIPROC_DIR=${METRICS_MULTIPROC_DIR:-/tmp/mock_metrics}
+rm -rf "$METRICS_MULTIPROC_DIR" && mkdir -p "$METRICS_MULTIPROC_DIR"
+
 gunicorn src.main:app --workers 4 --worker-class uvicorn.workers.UvicornWorker --bind=0.0.0.0:8086
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""add lookup indexes
+
+Revision ID: 2ad5a97b95fb
+Revises: bea8a807f74c
+Create Date: 2026-10-18 11:42:05.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2ad5a97b95fb'
+down_revision: Union[str, Sequence[str], None] = 'bea8a807f74c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Дубликаты, которые не дают создать уникальные индексы: (описание, запрос)
+DUPLICATE_CHECKS = [
+    ("группы с одинаковым endpoint у пользователя (user_id, endpoint)",
+     'SELECT user_id, endpoint, count(*) FROM "group" GROUP BY user_id, endpoint HAVING count(*) > 1'),
+    ("эндпоинты с одинаковым путем и методом в группе (group_id, path, method)",
+     'SELECT group_id, path, method, count(*) FROM endpoint GROUP BY group_id, path, method HAVING count(*) > 1'),
+]
+
+
+def check_duplicates() -> None:
+    """
+    Проверка перед созданием уникальных индексов
+
+    Раньше дубликаты групп и эндпоинтов не запрещались. Какой из них оставить, решает владелец
+    данных, поэтому миграция не удаляет их сама, а останавливается со списком дубликатов.
+    """
+    bind = op.get_bind()
+    problems = []
+    for description, query in DUPLICATE_CHECKS:
+        rows = bind.execute(text(query)).fetchall()
+        if rows:
+            problems.append(f"{description}:\n" + "\n".join(f"  {tuple(row)}" for row in rows[:20])
+                            + (f"\n  ... всего {len(rows)}" if len(rows) > 20 else ""))
+    if problems:
+        raise RuntimeError("Уникальные индексы не созданы, сначала удалите дубликаты\n" + "\n".join(problems))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    check_duplicates()
+    op.create_index('ix_group_user_id_endpoint', 'group', ['user_id', 'endpoint'], unique=True)
+    op.create_index('ix_endpoint_group_id_path_method', 'endpoint', ['group_id', 'path', 'method'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_endpoint_group_id_path_method', table_name='endpoint')
+    op.drop_index('ix_group_user_id_endpoint', table_name='group')
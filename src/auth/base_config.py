@@ -1,8 +1,13 @@
+import time
+
+import jwt
 from fastapi_users.authentication import CookieTransport, AuthenticationBackend, BearerTransport
 from fastapi_users.authentication import JWTStrategy
+from fastapi_users.jwt import decode_jwt
 
-from fastapi_users import FastAPIUsers
+from fastapi_users import BaseUserManager, FastAPIUsers, exceptions
 
+from src.auth.cache import CachedToken, snapshot_user, token_cache
 from src.auth.models import User
 from src.auth.manager import get_user_manager
 from src.config import SECRET_AUTH
@@ -10,8 +15,41 @@ from src.config import SECRET_AUTH
 cookie_transport = CookieTransport(cookie_max_age=3600)
 bearer_transport = BearerTransport("auth/jwt/login")
 
+
+class CachedJWTStrategy(JWTStrategy[User, int]):
+    """
+    JWTStrategy, которая запоминает проверенные токены.
+
+    Повторный запрос с тем же токеном не декодирует JWT и не читает пользователя из Postgres.
+    Записи сбрасываются событием user шины инвалидации (изменение, деактивация, удаление).
+    """
+
+    async def read_token(self, token: str | None, user_manager: BaseUserManager[User, int]) -> User | None:
+        if token is None:
+            return None
+
+        cached = token_cache.get(token)
+        if cached is not None:
+            if cached.expires_at is None or cached.expires_at > time.time():
+                return cached.user
+            token_cache.pop(token)
+            return None
+
+        try:
+            data = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+            user_id = data.get("sub")
+            if user_id is None:
+                return None
+            user = await user_manager.get(user_manager.parse_id(user_id))
+        except (jwt.PyJWTError, exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+
+        token_cache.set(token, CachedToken(snapshot_user(user), data.get("exp")))
+        return user
+
+
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET_AUTH, lifetime_seconds=3600)
+    return CachedJWTStrategy(secret=SECRET_AUTH, lifetime_seconds=3600)
 
 
 # В транспорте можно попробовать использовать Bearer
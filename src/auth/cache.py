@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+from src.auth.models import User
+from src.cache import TTLCache
+from src.config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+from src.invalidation import RESET, invalidation_bus
+from src.metrics import cache_metrics, registry
+
+
+@dataclass(frozen=True)
+class CachedToken:
+    user: User
+    # Срок действия токена (exp, unix time): запись не переживает сам токен
+    expires_at: Optional[float]
+
+
+class TokenCache(TTLCache):
+    """
+    Кэш проверенных JWT: токен -> снимок пользователя.
+
+    Записи индексируются по id пользователя, чтобы изменение или деактивация
+    пользователя сбрасывали все его токены.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self._by_user: Dict[int, Set[str]] = {}
+
+    def invalidate_user(self, user_id: int) -> None:
+        for token in list(self._by_user.get(user_id, ())):
+            self.pop(token)
+
+    def _on_set(self, key: str, value: CachedToken) -> None:
+        self._by_user.setdefault(value.user.id, set()).add(key)
+
+    def _on_remove(self, key: str, value: CachedToken) -> None:
+        tokens = self._by_user.get(value.user.id)
+        if tokens is not None:
+            tokens.discard(key)
+            if not tokens:
+                del self._by_user[value.user.id]
+
+
+def snapshot_user(user: User) -> User:
+    """Копия пользователя, не привязанная к сессии запроса, в котором он был загружен"""
+    return User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+
+
+token_cache = TokenCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+registry.collector(lambda: cache_metrics("auth_token_cache", "Кэш проверенных JWT", token_cache.stats()))
+
+invalidation_bus.subscribe("user", lambda event: token_cache.invalidate_user(event["user_id"]))
+invalidation_bus.subscribe(RESET, lambda event: token_cache.clear())
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException
+from fastapi_users.password import PasswordHelperProtocol
+
+from src.config import AUTH_HASH_WORKERS, AUTH_HASH_QUEUE_LIMIT
+from src.metrics import format_metric, record_stage, registry
+
+T = TypeVar("T")
+
+# Хэширование пароля (argon2/bcrypt) занимает десятки миллисекунд CPU: в event loop оно
+# останавливает отдачу моков всего воркера, поэтому выполняется в отдельном пуле потоков
+_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="password-hash")
+_slots = asyncio.Semaphore(AUTH_HASH_WORKERS)
+_waiting = 0
+
+queue_duration = registry.histogram(
+    "auth_hash_queue_seconds", "Ожидание свободного потока хэширования паролей", ("operation",))
+hash_duration = registry.histogram(
+    "auth_hash_duration_seconds", "Длительность хэширования и проверки паролей", ("operation",))
+
+
+async def run_hashing(operation: str, func: Callable[..., T], *args) -> T:
+    """
+    Выполнение функции хэширования в пуле потоков с ограничением параллельности
+
+    Args:
+        operation: Название операции для метрик (hash, verify)
+        func: Синхронная функция хэширования
+        args: Аргументы функции
+
+    Returns:
+        T: Результат функции
+    """
+    global _waiting
+    if _waiting >= AUTH_HASH_QUEUE_LIMIT:
+        # Всплеск логинов не должен копить бесконечную очередь: клиент повторит попытку
+        raise HTTPException(
+            status_code=503,
+            detail="Too many authentication requests",
+            headers={"Retry-After": "1"}
+        )
+
+    queued_at = time.perf_counter()
+    _waiting += 1
+    try:
+        await _slots.acquire()
+    finally:
+        _waiting -= 1
+
+    try:
+        started_at = time.perf_counter()
+        queue_duration.observe(started_at - queued_at, operation)
+        result = await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+        elapsed = time.perf_counter() - started_at
+        hash_duration.observe(elapsed, operation)
+        record_stage("password", elapsed)
+        return result
+    finally:
+        _slots.release()
+
+
+async def hash_password(helper: PasswordHelperProtocol, password: str) -> str:
+    return await run_hashing("hash", helper.hash, password)
+
+
+async def verify_password(helper: PasswordHelperProtocol, password: str,
+                          hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await run_hashing("verify", helper.verify_and_update, password, hashed_password)
+
+
+def _collect() -> List[str]:
+    return format_metric("auth_hash_waiting", "gauge", "Запросы, ожидающие потока хэширования паролей",
+                         [({}, _waiting)])
+
+
+registry.collector(_collect)
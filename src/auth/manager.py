@@ -1,12 +1,14 @@
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from fastapi import Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_users import BaseUserManager, IntegerIDMixin, exceptions, models, schemas
 
+from src.auth.hashing import hash_password, verify_password
 from src.auth.models import User
 from src.auth.utils import get_user_db
-from src.config import MONGO_LINK, MONGO_BASE
-from src.mongo import MongoManager
+from src.invalidation import invalidation_bus
+from src.mongo import mongo_manager
 
 SECRET = "SECRET"
 
@@ -17,8 +19,22 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
 
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         # создаем коллекцию в монго с ником пользователя
-        with MongoManager(MONGO_LINK, MONGO_BASE) as mongo:
-            mongo.create_collection_if_not_exists(user.username)
+        await mongo_manager.create_collection_if_not_exists(user.username)
+        # Имя могло уже запрашиваться в /api и запомниться как несуществующее
+        await self._publish_user_changed(user)
+
+    async def on_after_update(self, user: User, update_dict: Dict[str, Any], request: Optional[Request] = None):
+        await self._publish_user_changed(user)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        await self._publish_user_changed(user)
+
+    async def _publish_user_changed(self, user: User):
+        # Кэшированные токены пользователя сбрасываются во всех воркерах,
+        # иначе измененный или деактивированный пользователь продолжит проходить аутентификацию
+        session = self.user_db.session
+        await invalidation_bus.publish(session, "user", user_id=user.id, username=user.username)
+        await session.commit()
 
     async def create(
             self,
@@ -38,7 +54,7 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
             else user_create.create_update_dict_superuser()
         )
         password = user_dict.pop("password")
-        user_dict["hashed_password"] = self.password_helper.hash(password)
+        user_dict["hashed_password"] = await hash_password(self.password_helper, password)
         user_dict["role_id"] = 1
 
         created_user = await self.user_db.create(user_dict)
@@ -47,5 +63,24 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
 
         return created_user
 
+    async def authenticate(self, credentials: OAuth2PasswordRequestForm) -> Optional[User]:
+        # То же, что в BaseUserManager, но хэширование не блокирует event loop
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Хэшируем и для несуществующего пользователя, чтобы время ответа не выдавало email
+            await hash_password(self.password_helper, credentials.password)
+            return None
+
+        verified, updated_password_hash = await verify_password(
+            self.password_helper, credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+
+        return user
+
 async def get_user_manager(user_db=Depends(get_user_db)):
     yield UserManager(user_db)
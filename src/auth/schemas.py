@@ -1,6 +1,9 @@
 from typing import Optional
 
 from fastapi_users import schemas
+from pydantic import field_validator
+
+from src.mongo import RESERVED_COLLECTION_PREFIXES, is_reserved_collection
 
 
 class UserRead(schemas.BaseUser[int]):
@@ -25,3 +28,12 @@ class UserCreate(schemas.BaseUserCreate):
     is_active: Optional[bool] = True
     is_superuser: Optional[bool] = False
     is_verified: Optional[bool] = False
+
+    @field_validator("username")
+    @classmethod
+    def username_not_reserved(cls, username: str) -> str:
+        # Имя пользователя становится именем его коллекции в MongoDB:
+        # служебные имена перезаписали бы общие тела, статистику или GridFS
+        if is_reserved_collection(username):
+            raise ValueError(f"Имя пользователя не может начинаться с {', '.join(RESERVED_COLLECTION_PREFIXES)}")
+        return username
@@ -1,8 +1,6 @@
 from dotenv import load_dotenv
 import os
 
-from src.mongo import MongoManager
-
 load_dotenv()
 
 DB_HOST = os.environ.get("DB_HOST")
@@ -10,8 +8,104 @@ DB_PORT = os.environ.get("DB_PORT")
 DB_NAME = os.environ.get("DB_NAME")
 DB_USER = os.environ.get("DB_USER")
 DB_PASS = os.environ.get("DB_PASS")
+# Полная строка подключения SQLAlchemy; если не задана, собирается из DB_* для asyncpg
+DB_URL = os.environ.get("DATABASE_URL")
+# Пул соединений SQLAlchemy на воркер: при 4 воркерах Postgres видит до 4 * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+# Кэш подготовленных выражений asyncpg на соединение и кэш скомпилированных запросов SQLAlchemy
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 256))
+DB_QUERY_CACHE_SIZE = int(os.environ.get("DB_QUERY_CACHE_SIZE", 500))
 
 MONGO_LINK = f"mongodb://{os.environ.get("MONGO_HOST")}:{os.environ.get("MONGO_PORT")}/"
 MONGO_BASE = os.environ.get("MONGO_BASE")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_TIMEOUT_MS = int(os.environ.get("MONGO_TIMEOUT_MS", 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 10000))
+
+# Кэш разрешенных маршрутов /api внутри воркера
+MOCK_CACHE_SIZE = int(os.environ.get("MOCK_CACHE_SIZE", 10000))
+MOCK_CACHE_TTL = float(os.environ.get("MOCK_CACHE_TTL", 300))
+
+# Скомпилированные таблицы маршрутов пользователей
+MOCK_ROUTING_USERS = int(os.environ.get("MOCK_ROUTING_USERS", 1000))
+MOCK_ROUTING_TTL = float(os.environ.get("MOCK_ROUTING_TTL", 3600))
+
+# Максимальное количество эндпоинтов в одном запросе POST /endpoint/bulk
+MOCK_BULK_MAX_ITEMS = int(os.environ.get("MOCK_BULK_MAX_ITEMS", 5000))
+
+# Размер пакета записи при импорте OpenAPI/HAR
+MOCK_IMPORT_BATCH_SIZE = int(os.environ.get("MOCK_IMPORT_BATCH_SIZE", 500))
+
+# Максимум запросов в POST /api/_batch
+MOCK_BATCH_MAX_ITEMS = int(os.environ.get("MOCK_BATCH_MAX_ITEMS", 1000))
+
+# Тела моков больше порога (в байтах JSON) хранятся в GridFS и отдаются потоком
+MOCK_GRIDFS_THRESHOLD = int(os.environ.get("MOCK_GRIDFS_THRESHOLD", 1024 * 1024))
+MOCK_GRIDFS_BUCKET = os.environ.get("MOCK_GRIDFS_BUCKET", "payloads")
+
+# Предварительно сжатые варианты тел моков (gzip, br), считаются при записи
+MOCK_COMPRESS_MIN_SIZE = int(os.environ.get("MOCK_COMPRESS_MIN_SIZE", 1024))
+MOCK_GZIP_LEVEL = int(os.environ.get("MOCK_GZIP_LEVEL", 9))
+MOCK_BROTLI_QUALITY = int(os.environ.get("MOCK_BROTLI_QUALITY", 11))
+
+# Общие тела моков, адресуемые по хэшу содержимого (одно на все эндпоинты с тем же телом)
+MOCK_PAYLOAD_CACHE_SIZE = int(os.environ.get("MOCK_PAYLOAD_CACHE_SIZE", 1000))
+MOCK_PAYLOAD_CACHE_TTL = float(os.environ.get("MOCK_PAYLOAD_CACHE_TTL", 3600))
+
+# Сжатое хранение тел в MongoDB: zstd (если доступен, иначе zlib) или zlib; пустое значение - без сжатия.
+# Сжимаются тела от MOCK_STORAGE_MIN_SIZE байт (тела в GridFS хранятся как есть)
+MOCK_STORAGE_CODEC = os.environ.get("MOCK_STORAGE_CODEC", "")
+MOCK_STORAGE_MIN_SIZE = int(os.environ.get("MOCK_STORAGE_MIN_SIZE", 64 * 1024))
+
+# Пагинация массивов в /api (_page, _limit, _offset, _fields)
+MOCK_PAGE_SIZE = int(os.environ.get("MOCK_PAGE_SIZE", 10))
+MOCK_PAGE_MAX_LIMIT = int(os.environ.get("MOCK_PAGE_MAX_LIMIT", 1000))
+
+# Учет попаданий в моки: кольцевой буфер в памяти воркера, который фоновая задача сбрасывает в MongoDB.
+# При переполнении вытесняются самые старые попадания (счетчик mock_hits_dropped_total)
+MOCK_HITS_BUFFER_SIZE = int(os.environ.get("MOCK_HITS_BUFFER_SIZE", 100000))
+MOCK_HITS_FLUSH_INTERVAL = float(os.environ.get("MOCK_HITS_FLUSH_INTERVAL", 5))
+# Доля попаданий, для которых сохраняется образец запроса (query и начало тела)
+MOCK_HITS_SAMPLE_RATE = float(os.environ.get("MOCK_HITS_SAMPLE_RATE", 0.01))
+MOCK_HITS_SAMPLE_BYTES = int(os.environ.get("MOCK_HITS_SAMPLE_BYTES", 2048))
+MOCK_HITS_SAMPLE_TTL = int(os.environ.get("MOCK_HITS_SAMPLE_TTL", 7 * 24 * 3600))
+
+# Лимит запросов к /api на пользователя (token bucket): запросов в секунду и размер всплеска, 0 - без лимита.
+# Переопределяется в role.permissions ({"rate_limit": {"rps": 50, "burst": 100}}; права берутся из таблицы
+# маршрутов, поэтому и при MOCK_RESOLVE_MODE=mongo корзина стоит одного запроса к Postgres на пользователя)
+# и для отдельных пользователей в MOCK_RATE_LIMIT_OVERRIDES ({"username": {"rps": 10, "burst": 20}})
+MOCK_RATE_LIMIT_RPS = float(os.environ.get("MOCK_RATE_LIMIT_RPS", 0))
+MOCK_RATE_LIMIT_BURST = float(os.environ.get("MOCK_RATE_LIMIT_BURST", 0))
+MOCK_RATE_LIMIT_OVERRIDES = os.environ.get("MOCK_RATE_LIMIT_OVERRIDES", "{}")
+
+# Способ разрешения /api: postgres (join user/group/endpoint) или mongo (одно чтение по ключу в документе)
+MOCK_RESOLVE_MODE = os.environ.get("MOCK_RESOLVE_MODE", "postgres")
+
+# Файл снимка (python -m src.script_snapshot): если задан, /api отдается из него без подключений к базам
+MOCK_SNAPSHOT_PATH = os.environ.get("MOCK_SNAPSHOT_PATH")
+
+# Канал Postgres LISTEN/NOTIFY для инвалидации кэшей во всех воркерах
+INVALIDATION_CHANNEL = os.environ.get("INVALIDATION_CHANNEL", "mock_invalidation")
+INVALIDATION_HEALTHCHECK_INTERVAL = float(os.environ.get("INVALIDATION_HEALTHCHECK_INTERVAL", 5))
 
 SECRET_AUTH = os.environ.get("SECRET_AUTH")
+
+# Кэш проверенных JWT -> пользователь, чтобы не читать user из Postgres на каждый запрос
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", 10000))
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", 60))
+
+# Хэширование паролей в отдельных потоках: число потоков и предел ожидающих запросов
+AUTH_HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", 2))
+AUTH_HASH_QUEUE_LIMIT = int(os.environ.get("AUTH_HASH_QUEUE_LIMIT", 256))
+
+# Общий каталог метрик воркеров gunicorn: каждый воркер пишет туда свои метрики,
+# а /metrics любого воркера отдает метрики всех (с меткой worker). Пустое значение - только свой воркер
+METRICS_MULTIPROC_DIR = os.environ.get("METRICS_MULTIPROC_DIR", "")
+METRICS_EXPORT_INTERVAL = float(os.environ.get("METRICS_EXPORT_INTERVAL", 5))
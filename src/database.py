@@ -1,21 +1,111 @@
-from typing import AsyncGenerator
-from sqlalchemy import MetaData
+import time
+from typing import AsyncGenerator, List
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from src.config import DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME
+from src.config import (DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME, DB_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+                        DB_POOL_TIMEOUT, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_STATEMENT_CACHE_SIZE,
+                        DB_QUERY_CACHE_SIZE)
+from src.metrics import format_metric, record_stage, registry
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = DB_URL or f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 Base: DeclarativeMeta = declarative_base()
 
 # metadata = MetaData()
 
-engine = create_async_engine(DATABASE_URL)
+pool_wait = registry.histogram("db_pool_wait_seconds", "Ожидание соединения из пула SQLAlchemy", ())
+_pool_timeouts = 0
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который измеряет ожидание свободного соединения"""
+
+    def _do_get(self):
+        global _pool_timeouts
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            _pool_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            pool_wait.observe(waited)
+            record_stage("pool", waited)
+
+
+def _engine_options(url: str) -> dict:
+    options = {"query_cache_size": DB_QUERY_CACHE_SIZE}
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # SQLite в памяти живет в одном соединении: пул не настраивается
+        return options
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+# Время SQL-запросов попадает в этап "sql" текущего HTTP-запроса.
+# Начало хранится в контексте выполнения: он живет один запрос, и упавшее выражение не оставляет следов
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_started", None)
+    if started is not None:
+        record_stage("sql", time.perf_counter() - started)
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _handle_error(exception_context):
+    # Упавшее выражение тоже занимало базу, его время учитывается в том же этапе
+    started = getattr(exception_context.execution_context, "query_started", None)
+    if started is not None:
+        record_stage("sql", time.perf_counter() - started)
+
+
+def _collect_pool() -> List[str]:
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return []
+    lines = []
+    for name, value, description in (
+            ("size", pool.size(), "Постоянный размер пула"),
+            ("checked_out", pool.checkedout(), "Соединения, выданные запросам"),
+            ("checked_in", pool.checkedin(), "Свободные соединения в пуле"),
+            ("overflow", pool.overflow(), "Соединения сверх pool_size (отрицательное - еще не открытые)")):
+        lines += format_metric(f"db_pool_{name}", "gauge", description, [({}, value)])
+    lines += format_metric("db_pool_timeouts_total", "counter", "Запросы, не дождавшиеся соединения",
+                           [({}, _pool_timeouts)])
+    return lines
+
+
+registry.collector(_collect_pool)
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
@@ -0,0 +1,183 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import ijson
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from src.auth.models import User
+from src.config import MOCK_IMPORT_BATCH_SIZE
+from src.endpoints.schemas import EndpointCreate
+from src.endpoints.utils import create_endpoints
+from src.groups.models import group
+from src.invalidation import invalidation_bus
+from src.mongo import AsyncMongoManager
+
+IMPORT_METHODS = ("get", "post", "put", "patch", "delete")
+
+
+@dataclass
+class ImportedEndpoint:
+    path: str
+    method: str
+    data: Any
+    # Запись источника не разобрана: эндпоинт не создается и попадает в пропущенные
+    error: Optional[str] = None
+
+
+def detect_format(filename: Optional[str]) -> str:
+    return "har" if filename and filename.lower().endswith(".har") else "openapi"
+
+
+def iter_openapi(source: BinaryIO) -> Iterator[ImportedEndpoint]:
+    """
+    Потоковый разбор OpenAPI 3 (JSON): в памяти одновременно только один path item.
+
+    Тело мока берется из примера первого успешного ответа с JSON-содержимым,
+    а если примера нет - строится по встроенной схеме ответа.
+    """
+    for path, path_item in ijson.kvitems(source, "paths", use_float=True):
+        for method in IMPORT_METHODS:
+            operation = path_item.get(method)
+            if isinstance(operation, dict):
+                yield ImportedEndpoint(path.strip("/"), method.upper(), _openapi_example(operation))
+
+
+def _openapi_example(operation: Dict[str, Any]) -> Any:
+    responses = operation.get("responses") or {}
+    codes = sorted(code for code in responses if str(code).startswith("2")) or sorted(responses)
+    for code in codes:
+        content = (responses[code] or {}).get("content") or {}
+        media = next((media for media_type, media in content.items() if "json" in media_type), None)
+        if media is None:
+            continue
+        if "example" in media:
+            return media["example"]
+        examples = media.get("examples") or {}
+        for example in examples.values():
+            if isinstance(example, dict) and "value" in example:
+                return example["value"]
+        return _sample_from_schema(media.get("schema") or {})
+    return None
+
+
+def _sample_from_schema(schema: Dict[str, Any], depth: int = 0) -> Any:
+    # Ссылки $ref не разрешаются: components при потоковом разборе еще не прочитаны
+    if depth > 8 or "$ref" in schema:
+        return None
+    if "example" in schema:
+        return schema["example"]
+    if "default" in schema:
+        return schema["default"]
+    if schema.get("enum"):
+        return schema["enum"][0]
+    for combined in ("allOf", "oneOf", "anyOf"):
+        if schema.get(combined):
+            return _sample_from_schema(schema[combined][0], depth + 1)
+
+    schema_type = schema.get("type")
+    if schema_type == "object" or "properties" in schema:
+        return {name: _sample_from_schema(value, depth + 1)
+                for name, value in (schema.get("properties") or {}).items()}
+    if schema_type == "array":
+        return [_sample_from_schema(schema.get("items") or {}, depth + 1)]
+    return {"string": "string", "integer": 0, "number": 0, "boolean": True}.get(schema_type)
+
+
+def iter_har(source: BinaryIO, base_path: str = "") -> Iterator[ImportedEndpoint]:
+    """
+    Потоковый разбор HAR: записи log.entries читаются по одной.
+
+    Берутся ответы с JSON-содержимым; путь - путь URL без base_path.
+    Для повторяющихся метода и пути остается первый успешный ответ.
+    Записи с некорректным статусом или телом возвращаются с error и номером записи.
+    """
+    prefix = base_path.strip("/")
+    seen: Set[Tuple[str, str]] = set()
+    for index, entry in enumerate(ijson.items(source, "log.entries.item", use_float=True)):
+        request = entry.get("request") or {}
+        response = entry.get("response") or {}
+        content = response.get("content") or {}
+        if "json" not in (content.get("mimeType") or ""):
+            continue
+
+        path = urlsplit(request.get("url", "")).path.strip("/")
+        if prefix:
+            if path != prefix and not path.startswith(prefix + "/"):
+                continue
+            path = path[len(prefix):].strip("/")
+        method = (request.get("method") or "GET").upper()
+        if not path or (method, path) in seen:
+            continue
+
+        try:
+            status = int(response.get("status") or 0)
+        except (TypeError, ValueError):
+            yield ImportedEndpoint(path, method, None, error=f"log.entries[{index}]: некорректный status")
+            continue
+        if not 200 <= status < 300:
+            continue
+
+        text = content.get("text") or "null"
+        try:
+            if content.get("encoding") == "base64":
+                text = base64.b64decode(text).decode()
+            data = json.loads(text)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            yield ImportedEndpoint(path, method, None, error=f"log.entries[{index}]: содержимое не JSON")
+            continue
+        seen.add((method, path))
+        yield ImportedEndpoint(path, method, data)
+
+
+async def import_endpoints(session: AsyncSession, mongo: AsyncMongoManager, user: User,
+                           endpoints: Iterator[ImportedEndpoint], group_endpoint: str,
+                           group_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Импорт эндпоинтов в группу пользователя пакетами по MOCK_IMPORT_BATCH_SIZE
+
+    Группа создается, если ее нет. Разбор источника выполняется в пуле потоков,
+    чтобы чтение большого файла не блокировало event loop.
+
+    Returns:
+        Dict[str, Any]: Количество созданных и пропущенных эндпоинтов и первые ошибки
+    """
+    group_id = (await session.execute(
+        select(group.c.id).where(group.c.user_id == user.id, group.c.endpoint == group_endpoint)
+    )).scalar()
+    if group_id is None:
+        await session.execute(insert(group).values(
+            name=group_name or group_endpoint, endpoint=group_endpoint, active=True,
+            description="Импортировано", user_id=user.id
+        ))
+        await invalidation_bus.publish(session, "group", username=user.username, group=group_endpoint)
+        await session.commit()
+
+    summary: Dict[str, Any] = {"created": 0, "skipped": 0, "errors": []}
+    while True:
+        batch: List[ImportedEndpoint] = await run_in_threadpool(
+            lambda: list(islice(endpoints, MOCK_IMPORT_BATCH_SIZE)))
+        if not batch:
+            break
+
+        valid = [item for item in batch if item.error is None]
+        items = [EndpointCreate(path=item.path, method=item.method, json_data=json.dumps(item.data),
+                                group_name=group_endpoint) for item in valid]
+        results = await create_endpoints(session, mongo, user, items) if items else []
+        skipped = [(item, item.error) for item in batch if item.error is not None]
+        for item, result in zip(valid, results):
+            if result["status"] == "created":
+                summary["created"] += 1
+            else:
+                skipped.append((item, result["detail"]))
+        for item, detail in skipped:
+            summary["skipped"] += 1
+            if len(summary["errors"]) < 100:
+                summary["errors"].append({"path": item.path, "method": item.method, "detail": detail})
+    return summary
@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, Integer, String, ForeignKey, DateTime, func, MetaData
+from sqlalchemy import Table, Column, Integer, String, ForeignKey, DateTime, func, MetaData, Index
 
 from src.groups.models import group
 
@@ -12,5 +12,6 @@ endpoint = Table(
     Column("method", String, nullable=False),
     Column("group_id", Integer, ForeignKey(group.c.id)),
     Column("created_at", DateTime, server_default=func.now()),
-    Column("updated_at", DateTime, server_default=func.now(), onupdate=func.now())
+    Column("updated_at", DateTime, server_default=func.now(), onupdate=func.now()),
+    Index("ix_endpoint_group_id_path_method", "group_id", "path", "method", unique=True)
 )
\ No newline at end of file
@@ -1,18 +1,27 @@
-import json
 from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, insert
+import ijson
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import delete, select, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.auth.base_config import current_user
 from src.auth.models import User
-from src.config import MONGO_LINK, MONGO_BASE
+from src.config import MOCK_BULK_MAX_ITEMS
 from src.database import get_async_session
+from src.endpoints.importers import detect_format, import_endpoints, iter_har, iter_openapi
 from src.endpoints.models import endpoint
 from src.endpoints.schemas import EndpointCreate
+from src.endpoints.utils import (create_endpoints, discard_endpoints, endpoint_document, parse_json_data,
+                                 parse_ndjson_line)
 from src.groups.models import group
-from src.mongo import MongoManager
+from src.invalidation import invalidation_bus
+from src.mocks.hits import empty_stats, load_samples, load_stats
+from src.mocks.payloads import load_data, release_payloads, store_payload
+from src.mongo import AsyncMongoManager, get_mongo
 
 router = APIRouter(
     prefix="/endpoint",
@@ -24,9 +33,15 @@ router = APIRouter(
 async def create_endpoint(
         new_endpoint: EndpointCreate,
         user: User = Depends(current_user),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_async_session),
+        mongo: AsyncMongoManager = Depends(get_mongo)
 ):
     data = new_endpoint.dict()
+    # Тело проверяется до записи в Postgres: иначе осталась бы строка endpoint без документа в MongoDB
+    try:
+        json_data = parse_json_data(data['json_data'])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Некорректный json_data: {e}")
 
     group_query = select(group).where(
         group.c.endpoint == data['group_name'],
@@ -37,8 +52,8 @@ async def create_endpoint(
 
     if not existing_group:
         # Если группа не найдена, можно создать новую или вернуть ошибку
-        return HTTPException(status_code=404,
-                             detail=f"Группа '{data['group_name']}' не найдена или у пользователя нет прав")
+        raise HTTPException(status_code=404,
+                            detail=f"Группа '{data['group_name']}' не найдена или у пользователя нет прав")
 
     group_id = existing_group.id
 
@@ -52,42 +67,150 @@ async def create_endpoint(
     }
 
     insert_query = insert(endpoint).values(**endpoint_data)
-    result = await session.execute(insert_query)
+    try:
+        result = await session.execute(insert_query)
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=409,
+                            detail=f"Эндпоинт {endpoint_data['method']} '{data['path']}' уже существует в группе")
+    await invalidation_bus.publish(session, "route", username=user.username, group=data['group_name'],
+                                   path=data['path'], method=endpoint_data['method'],
+                                   endpoint_id=result.inserted_primary_key[0])
     await session.commit()
 
-    json_data = json.loads(data['json_data'])
-
-    with MongoManager(MONGO_LINK, MONGO_BASE) as mongo:
-        mongo.insert_one(user.username, {
-            "group": data['group_name'],
-            "endpoint_id": result.inserted_primary_key[0],
-            "router": data['path'],
-            "method": data['method'].upper(),
-            "data": json_data,
-
-        })
+    document = await store_payload(mongo, endpoint_document(
+        user.username, data['group_name'], result.inserted_primary_key[0], data['path'], data['method'], json_data
+    ))
+    if await mongo.insert_one(user.username, document) is None:
+        # Строка endpoint уже закоммичена: удаляем ее, чтобы повтор запроса не получил 409
+        await discard_endpoints(session, mongo, user.username, [document])
+        raise HTTPException(status_code=503, detail="Не удалось сохранить тело эндпоинта, повторите попытку")
 
     # Возвращаем ID созданной записи
     return {"success": True, "data": []}
 
 
+@router.post("/bulk")
+async def create_endpoints_bulk(
+        request: Request,
+        user: User = Depends(current_user),
+        session: AsyncSession = Depends(get_async_session),
+        mongo: AsyncMongoManager = Depends(get_mongo)
+):
+    """
+    Пакетное создание эндпоинтов в любых группах пользователя.
+
+    Тело - JSON-массив EndpointCreate или NDJSON (Content-Type: application/x-ndjson),
+    по одному EndpointCreate на строку. Возвращает результат по каждому элементу.
+    """
+    items = []
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        buffer = bytearray()
+        line_number = 0
+        async for chunk in request.stream():
+            # Перевод строки ищется только в новом куске: длинная строка не сканируется заново
+            start = len(buffer)
+            buffer += chunk
+            end = buffer.rfind(b"\n", start)
+            if end == -1:
+                continue
+            lines = bytes(buffer[:end]).split(b"\n")
+            del buffer[:end + 1]
+            for line in lines:
+                line_number += 1
+                if line.strip():
+                    items.append(parse_ndjson_line(line, line_number))
+            if len(items) > MOCK_BULK_MAX_ITEMS:
+                # Остаток потока не читаем и не разбираем
+                raise HTTPException(status_code=413,
+                                    detail=f"Не больше {MOCK_BULK_MAX_ITEMS} эндпоинтов за запрос")
+        if buffer.strip():
+            items.append(parse_ndjson_line(bytes(buffer), line_number + 1))
+    else:
+        try:
+            items = TypeAdapter(List[EndpointCreate]).validate_json(await request.body())
+        except ValidationError as e:
+            # input не включаем: для невалидного JSON это bytes, которые не сериализуются в ответ
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_input=False))
+
+    if len(items) > MOCK_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Не больше {MOCK_BULK_MAX_ITEMS} эндпоинтов за запрос")
+
+    results = await create_endpoints(session, mongo, user, items)
+    return {"success": all(result["status"] == "created" for result in results), "data": results}
+
+
+@router.post("/import")
+async def import_endpoints_from_file(
+        file: UploadFile,
+        group_endpoint: str,
+        group_name: Optional[str] = None,
+        source: Optional[str] = None,
+        base_path: str = "",
+        user: User = Depends(current_user),
+        session: AsyncSession = Depends(get_async_session),
+        mongo: AsyncMongoManager = Depends(get_mongo)
+):
+    """
+    Импорт эндпоинтов и тел моков из OpenAPI 3 (JSON) или HAR в группу пользователя.
+
+    source: openapi или har (по умолчанию определяется по расширению файла);
+    base_path: префикс URL, который отрезается от путей запросов HAR.
+    """
+    source = source or detect_format(file.filename)
+    if source == "openapi":
+        endpoints = iter_openapi(file.file)
+    elif source == "har":
+        endpoints = iter_har(file.file, base_path)
+    else:
+        raise HTTPException(status_code=400, detail="source должен быть openapi или har")
+
+    try:
+        summary = await import_endpoints(session, mongo, user, endpoints, group_endpoint, group_name)
+    except ijson.JSONError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный файл {source}: {e}")
+    return {"success": not summary["errors"], "data": summary}
+
+
 @router.get("/id/")
 async def get_endpoint(id: int,
                        user: User = Depends(current_user),
-                       session: AsyncSession = Depends(get_async_session)):
+                       session: AsyncSession = Depends(get_async_session),
+                       mongo: AsyncMongoManager = Depends(get_mongo)):
     query = select(endpoint).where(endpoint.c.id == id)
-    result = await session.execute(query)
-    result = dict(result.mappings().first())
+    row = (await session.execute(query)).mappings().first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Эндпоинт не найден")
+    result = dict(row)
 
-    with MongoManager(MONGO_LINK, MONGO_BASE) as mongo:
-        mongo_data = mongo.find_one(user.username, id)
-
-    print(mongo_data)
-    result['json'] = mongo_data['data']
+    mongo_data = await mongo.find_one(user.username, id)
+    result['json'] = await load_data(mongo, mongo_data) if mongo_data else None
 
     return result
 
 
+@router.get("/{endpoint_id}/stats")
+async def get_endpoint_stats(endpoint_id: int,
+                             user: User = Depends(current_user),
+                             session: AsyncSession = Depends(get_async_session),
+                             mongo: AsyncMongoManager = Depends(get_mongo)):
+    query = select(endpoint.c.id, endpoint.c.path, endpoint.c.method).select_from(
+        endpoint.join(group, endpoint.c.group_id == group.c.id)
+    ).where(endpoint.c.id == endpoint_id, group.c.user_id == user.id)
+    row = (await session.execute(query)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Эндпоинт не найден")
+
+    stats = (await load_stats(mongo, [endpoint_id])).get(endpoint_id) or empty_stats()
+    return {
+        "endpoint_id": row.id,
+        "path": row.path,
+        "method": row.method,
+        **stats,
+        "samples": await load_samples(mongo, endpoint_id),
+    }
+
+
 @router.put("/")
 async def update_endpoint(
         new_endpoint: EndpointCreate,
@@ -101,7 +224,31 @@ async def update_endpoint(
 async def delete_endpoint(
         group_name: str,
         path: str,
+        method: Optional[str] = None,
         user: User = Depends(current_user),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_async_session),
+        mongo: AsyncMongoManager = Depends(get_mongo)
 ):
-    pass
+    """Удаление эндпоинта группы (всех методов пути, если method не указан)"""
+    query = select(endpoint.c.id, endpoint.c.method).select_from(
+        endpoint.join(group, endpoint.c.group_id == group.c.id)
+    ).where(group.c.endpoint == group_name, group.c.user_id == user.id, endpoint.c.path == path)
+    if method:
+        query = query.where(endpoint.c.method == method.upper())
+    rows = (await session.execute(query)).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"Эндпоинт '{path}' не найден в группе '{group_name}'")
+
+    endpoint_ids = [row.id for row in rows]
+    await session.execute(delete(endpoint).where(endpoint.c.id.in_(endpoint_ids)))
+    for row in rows:
+        await invalidation_bus.publish(session, "endpoint", username=user.username, endpoint_id=row.id)
+    await session.commit()
+
+    # Документы удаляются после коммита; общие тела теряют ссылку и удаляются, когда ссылок не осталось
+    documents = await mongo.find_many(user.username, endpoint_ids,
+                                      {"_id": 0, "payload": 1, "gridfs_id": 1, "encodings": 1})
+    await mongo.delete_many(user.username, {"endpoint_id": {"$in": endpoint_ids}})
+    await release_payloads(mongo, documents)
+
+    return {"success": True, "data": endpoint_ids}
@@ -0,0 +1,186 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Sequence
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import User
+from src.endpoints.models import endpoint
+from src.endpoints.schemas import EndpointCreate
+from src.groups.models import group
+from src.invalidation import invalidation_bus
+from src.mocks.payloads import release_payloads, store_payloads
+from src.mocks.trie import normalize_path
+from src.mongo import AsyncMongoManager
+
+
+def _reject_constant(name: str) -> Any:
+    raise ValueError(f"{name} не поддерживается в JSON")
+
+
+def parse_json_data(json_data: str) -> Any:
+    """
+    Разбор json_data эндпоинта
+
+    NaN и Infinity json.loads пропускает, но тело с ними не сериализуется при отдаче,
+    поэтому они отклоняются сразу (ValueError, как и синтаксические ошибки).
+    """
+    return json.loads(json_data, parse_constant=_reject_constant)
+
+
+def parse_ndjson_line(line: bytes, line_number: int) -> EndpointCreate:
+    """
+    Разбор строки NDJSON пакетного создания
+
+    Номер строки (с 1) ставится в loc ошибок вслед за "body", как индекс элемента JSON-массива.
+    input в ошибки не включается: для невалидного JSON это bytes, которые не сериализуются в ответ.
+    """
+    try:
+        return EndpointCreate.model_validate_json(line)
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_input=False)
+        for error in errors:
+            error["loc"] = ("body", line_number, *error["loc"])
+        raise HTTPException(status_code=422, detail=errors)
+
+
+def endpoint_document(username: str, group_name: str, endpoint_id: int, path: str, method: str,
+                      data: Any) -> Dict[str, Any]:
+    """Документ эндпоинта в коллекции пользователя в MongoDB"""
+    return {
+        "username": username,
+        "group": group_name,
+        "endpoint_id": endpoint_id,
+        # Ключ разрешения сравнивается с нормализованным путем запроса
+        "router": normalize_path(path),
+        "method": method.upper(),
+        "data": data,
+    }
+
+
+async def create_endpoints(session: AsyncSession, mongo: AsyncMongoManager, user: User,
+                           items: Sequence[EndpointCreate]) -> List[Dict[str, Any]]:
+    """
+    Пакетное создание эндпоинтов
+
+    Группы разрешаются одним запросом, строки endpoint вставляются одним
+    INSERT ... RETURNING в одной транзакции, документы - одним insert_many.
+    Ошибочные элементы не прерывают пакет, а получают свой статус в результате.
+
+    Args:
+        session: Сессия Postgres
+        mongo: Клиент MongoDB
+        user: Владелец эндпоинтов
+        items: Эндпоинты для создания
+
+    Returns:
+        List[Dict[str, Any]]: Результат по каждому элементу в исходном порядке
+    """
+    results: List[Dict[str, Any]] = [{"index": index} for index in range(len(items))]
+    pending = []
+    seen = set()
+    for index, item in enumerate(items):
+        method = item.method.upper()
+        key = (item.group_name, item.path, method)
+        if key in seen:
+            results[index].update(status="error", detail="Дубликат эндпоинта в запросе")
+            continue
+        try:
+            json_data = parse_json_data(item.json_data)
+        except ValueError as e:
+            results[index].update(status="error", detail=f"Некорректный json_data: {e}")
+            continue
+        seen.add(key)
+        pending.append((index, item, method, json_data))
+
+    group_names = {item.group_name for _, item, _, _ in pending}
+    group_result = await session.execute(
+        select(group.c.id, group.c.endpoint).where(group.c.user_id == user.id, group.c.endpoint.in_(group_names))
+    ) if group_names else []
+    group_ids = {row.endpoint: row.id for row in group_result}
+
+    # Уже существующие эндпоинты отсекаем заранее, чтобы не откатывать весь пакет
+    candidates = [(group_ids.get(item.group_name), item.path, method) for _, item, method, _ in pending]
+    existing_keys = set()
+    if group_ids:
+        existing_result = await session.execute(
+            select(endpoint.c.group_id, endpoint.c.path, endpoint.c.method).where(
+                tuple_(endpoint.c.group_id, endpoint.c.path, endpoint.c.method).in_(
+                    [candidate for candidate in candidates if candidate[0] is not None]
+                )
+            )
+        )
+        existing_keys = {tuple(row) for row in existing_result}
+
+    rows = []
+    accepted = []
+    now = datetime.utcnow()
+    for (index, item, method, json_data), candidate in zip(pending, candidates):
+        if candidate[0] is None:
+            results[index].update(status="error",
+                                  detail=f"Группа '{item.group_name}' не найдена или у пользователя нет прав")
+        elif candidate in existing_keys:
+            results[index].update(status="error", detail=f"Эндпоинт {method} '{item.path}' уже существует в группе")
+        else:
+            rows.append({"path": item.path, "method": method, "group_id": candidate[0],
+                         "created_at": now, "updated_at": now})
+            accepted.append((index, item, method, json_data))
+
+    if not rows:
+        return results
+
+    try:
+        inserted = await session.execute(
+            insert(endpoint).returning(endpoint.c.id, sort_by_parameter_order=True), rows
+        )
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="Эндпоинты изменены параллельным запросом, повторите попытку")
+    endpoint_ids = inserted.scalars().all()
+
+    for group_name in {item.group_name for _, item, _, _ in accepted}:
+        await invalidation_bus.publish(session, "group", username=user.username, group=group_name)
+    await session.commit()
+
+    documents = []
+    for (index, item, method, json_data), endpoint_id in zip(accepted, endpoint_ids):
+        documents.append(endpoint_document(user.username, item.group_name, endpoint_id, item.path, method, json_data))
+        results[index].update(status="created", endpoint_id=endpoint_id)
+    # Одинаковые тела пакета (и уже сохраненные ранее) записываются один раз
+    documents = await store_payloads(mongo, documents)
+    if len(await mongo.insert_many(user.username, documents)) < len(documents):
+        # insert_many с ordered=False мог записать часть документов: откатываем только остальные
+        stored = await mongo.find_many(user.username, [document["endpoint_id"] for document in documents],
+                                       {"_id": 0, "endpoint_id": 1})
+        stored = {document["endpoint_id"] for document in stored}
+        failed = [document for document in documents if document["endpoint_id"] not in stored]
+        await discard_endpoints(session, mongo, user.username, failed)
+        failed_ids = {document["endpoint_id"] for document in failed}
+        for result in results:
+            if result.get("endpoint_id") in failed_ids:
+                del result["endpoint_id"]
+                result.update(status="error", detail="Не удалось сохранить тело эндпоинта, повторите попытку")
+
+    return results
+
+
+async def discard_endpoints(session: AsyncSession, mongo: AsyncMongoManager, username: str,
+                            documents: List[Dict[str, Any]]) -> None:
+    """
+    Откат эндпоинтов, чьи документы не записались в MongoDB после коммита в Postgres
+
+    Строки endpoint удаляются (с событиями инвалидации), а ссылки на общие тела,
+    уже засчитанные store_payloads, освобождаются.
+    """
+    if not documents:
+        return
+    endpoint_ids = [document["endpoint_id"] for document in documents]
+    await session.execute(delete(endpoint).where(endpoint.c.id.in_(endpoint_ids)))
+    for endpoint_id in endpoint_ids:
+        await invalidation_bus.publish(session, "endpoint", username=username, endpoint_id=endpoint_id)
+    await session.commit()
+    await release_payloads(mongo, documents)
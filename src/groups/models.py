@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, Integer, String, ForeignKey, DateTime, func, MetaData, Boolean
+from sqlalchemy import Table, Column, Integer, String, ForeignKey, DateTime, func, MetaData, Boolean, Index
 
 from src.auth.models import User, user
 
@@ -14,5 +14,6 @@ group = Table(
     Column("description", String, nullable=True),
     Column("user_id", Integer, ForeignKey(user.c.id)),
     Column("created_at", DateTime, server_default=func.now()),
-    Column("updated_at", DateTime, server_default=func.now(), onupdate=func.now())
+    Column("updated_at", DateTime, server_default=func.now(), onupdate=func.now()),
+    Index("ix_group_user_id_endpoint", "user_id", "endpoint", unique=True)
 )
\ No newline at end of file
@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.auth.base_config import current_user
@@ -9,6 +12,13 @@ from src.database import get_async_session
 from src.endpoints.models import endpoint
 from src.groups.models import group
 from src.groups.schemas import GroupCreate
+from src.invalidation import invalidation_bus
+from src.mocks.hits import empty_stats, load_stats
+from src.mocks.payloads import load_data_many
+from src.mongo import AsyncMongoManager, get_mongo
+
+# Для встраивания тел нужен только исходный data (или ссылка на общее тело / GridFS), без готовых байтов
+PAYLOAD_PROJECTION = {"_id": 0, "endpoint_id": 1, "payload": 1, "data": 1, "gridfs_id": 1}
 
 router = APIRouter(
     prefix="/group",
@@ -23,15 +33,18 @@ async def create_group(
         session: AsyncSession = Depends(get_async_session)
 ):
     data = new_group.dict()
-    print(data)
     data['user_id'] = user.id
     stmt = insert(group).values(data)
-    await session.execute(stmt)
+    # уникальный индекс (user_id, endpoint) не дает создать вторую группу с тем же endpoint
+    try:
+        await session.execute(stmt)
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=409,
+                            detail=f"Группа с endpoint '{data['endpoint']}' уже существует")
+    await invalidation_bus.publish(session, "group", username=user.username, group=data['endpoint'])
     await session.commit()
     return {"status": "success"}
-    # проверить что у пользователя нет группы с таким же endpoint
-    # если есть отдаем ошибку
-    # в ином случае создаем запись в бд
 
 
 @router.get("/")
@@ -49,23 +62,38 @@ async def get_group(
 @router.get("/{id}")
 async def get_group_by_id(
                     group_id: int,
+                    include: Optional[str] = None,
                     user: User = Depends(current_user),
-                    session: AsyncSession = Depends(get_async_session)):
-
-    query = select(group).filter(
+                    session: AsyncSession = Depends(get_async_session),
+                    mongo: AsyncMongoManager = Depends(get_mongo)):
+
+    # Группа и ее эндпоинты одним запросом (LEFT JOIN: группа без эндпоинтов тоже вернется)
+    query = select(
+        group.c.id, group.c.name, group.c.description, group.c.active, group.c.endpoint,
+        *[column.label(f"endpoint_{column.name}") for column in endpoint.c]
+    ).select_from(
+        group.outerjoin(endpoint, endpoint.c.group_id == group.c.id)
+    ).where(
         group.c.id == group_id,
         group.c.user_id == user.id
-    )
-    group_data = await session.execute(query)
-    group_data = group_data.first()
+    ).order_by(endpoint.c.id)
+    rows = (await session.execute(query)).all()
 
-    if not group_data:
+    if not rows:
         return None
 
-    query = select(endpoint).where(endpoint.c.group_id == group_id)
-    result = await session.execute(query)
+    group_data = rows[0]
+    data = [
+        {column.name: getattr(row, f"endpoint_{column.name}") for column in endpoint.c}
+        for row in rows if row.endpoint_id is not None
+    ]
 
-    data = result.mappings().all()
+    if include == "payloads":
+        # Тела всех эндпоинтов группы одним запросом $in вместо GET /endpoint/id/ на каждый
+        documents = await mongo.find_many(user.username, [item["id"] for item in data], PAYLOAD_PROJECTION)
+        payloads = await load_data_many(mongo, documents)
+        for item in data:
+            item["json"] = payloads.get(item["id"])
 
     return {
                 "id": group_data.id,
@@ -77,6 +105,37 @@ async def get_group_by_id(
             }
 
 
+@router.get("/{group_id}/stats")
+async def get_group_stats(group_id: int,
+                          user: User = Depends(current_user),
+                          session: AsyncSession = Depends(get_async_session),
+                          mongo: AsyncMongoManager = Depends(get_mongo)):
+    query = select(
+        group.c.id, endpoint.c.id.label("endpoint_id"), endpoint.c.path, endpoint.c.method
+    ).select_from(
+        group.outerjoin(endpoint, endpoint.c.group_id == group.c.id)
+    ).where(
+        group.c.id == group_id,
+        group.c.user_id == user.id
+    ).order_by(endpoint.c.id)
+    rows = (await session.execute(query)).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Группа не найдена")
+
+    endpoints = [row for row in rows if row.endpoint_id is not None]
+    stats = await load_stats(mongo, [row.endpoint_id for row in endpoints])
+    data = [
+        {"endpoint_id": row.endpoint_id, "path": row.path, "method": row.method,
+         **(stats.get(row.endpoint_id) or empty_stats())}
+        for row in endpoints
+    ]
+    return {
+        "id": group_id,
+        "count": sum(item["count"] for item in data),
+        "data": data
+    }
+
+
 @router.put("/")
 async def update_group(
         new_group: GroupCreate,
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.config import INVALIDATION_CHANNEL, INVALIDATION_HEALTHCHECK_INTERVAL
+from src.database import engine
+
+Handler = Callable[[Dict[str, Any]], None]
+
+# Событие, которое рассылается подписчикам после (пере)подключения слушателя:
+# уведомления, пришедшие пока соединения не было, потеряны, и кэши надо сбросить целиком
+RESET = "reset"
+
+
+class InvalidationBus:
+    """
+    Шина инвалидации кэшей между воркерами gunicorn на Postgres LISTEN/NOTIFY.
+
+    Писатели вызывают publish() внутри своей транзакции: событие сразу применяется
+    в текущем воркере, а NOTIFY доставляется остальным воркерам после commit.
+    Каждый воркер держит фоновую задачу, которая слушает канал и вызывает подписчиков.
+    """
+
+    def __init__(self, engine: AsyncEngine, channel: str, healthcheck_interval: float = 5.0):
+        self.engine = engine
+        self.channel = channel
+        self.healthcheck_interval = healthcheck_interval
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def enabled(self) -> bool:
+        return self.engine.dialect.name == "postgresql"
+
+    def subscribe(self, kind: str, handler: Handler) -> None:
+        self._handlers.setdefault(kind, []).append(handler)
+
+    async def publish(self, session: AsyncSession, kind: str, **payload: Any) -> None:
+        """
+        Отправка события инвалидации
+
+        Args:
+            session: Сессия пишущего запроса; NOTIFY уйдет при ее commit
+            kind: Тип события (route, endpoint, group, user)
+            payload: Данные, по которым подписчики определяют затронутые ключи
+        """
+        event = {"kind": kind, **payload}
+        self.dispatch(event)
+        if self.enabled:
+            await session.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self.channel, "payload": json.dumps(event)}
+            )
+
+    def dispatch(self, event: Dict[str, Any]) -> None:
+        for handler in self._handlers.get(event.get("kind"), ()):
+            try:
+                handler(event)
+            except Exception as e:
+                self.logger.error(f"Ошибка обработки события инвалидации {event}: {e}")
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            self.logger.error(f"Некорректное событие инвалидации: {payload}")
+            return
+        self.dispatch(event)
+
+    async def _listen(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    driver = raw.driver_connection
+                    await driver.add_listener(self.channel, self._on_notify)
+                    self.logger.info(f"Подписка на канал {self.channel} установлена")
+                    self.dispatch({"kind": RESET})
+                    backoff = 1.0
+                    try:
+                        while not driver.is_closed():
+                            await asyncio.sleep(self.healthcheck_interval)
+                            await driver.execute("SELECT 1")
+                    finally:
+                        if not driver.is_closed():
+                            await driver.remove_listener(self.channel, self._on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Потеряно соединение слушателя {self.channel}: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+invalidation_bus = InvalidationBus(engine, INVALIDATION_CHANNEL, INVALIDATION_HEALTHCHECK_INTERVAL)
@@ -1,21 +1,48 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy import select, and_
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import FastAPI, Depends
 from starlette.middleware.cors import CORSMiddleware
 
 from src.auth.base_config import auth_backend, current_user, fastapi_users
-from src.config import MONGO_LINK, MONGO_BASE
-from src.database import get_async_session
-from src.endpoints.models import endpoint
 from src.endpoints.router import router as endpoint_router
-from src.groups.models import group
 from src.groups.router import router as groups_router
-from src.auth.models import User, user
+from src.auth.models import User
 from src.auth.schemas import UserRead, UserCreate
-from src.mongo import MongoManager
-
-app = FastAPI()
+from src.config import MOCK_SNAPSHOT_PATH
+from src.invalidation import invalidation_bus
+from src.metrics import MetricsMiddleware, exporter as metrics_exporter, router as metrics_router
+from src.mocks.hits import hit_recorder
+from src.mocks.router import router as mocks_router
+from src.mocks.snapshot import router as snapshot_router, snapshot
+from src.mongo import mongo_manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MOCK_SNAPSHOT_PATH:
+        # Режим снимка: /api отдается из файла через mmap, к Postgres и MongoDB не подключаемся
+        snapshot.open(MOCK_SNAPSHOT_PATH)
+        metrics_exporter.start()
+        yield
+        await metrics_exporter.stop()
+        snapshot.close()
+        return
+
+    # Клиент MongoDB создается один раз на воркер и закрывается при остановке
+    if await mongo_manager.connect():
+        await mongo_manager.ensure_all_indexes()
+    invalidation_bus.start()
+    hit_recorder.start()
+    metrics_exporter.start()
+    yield
+    await metrics_exporter.stop()
+    await hit_recorder.stop()
+    await invalidation_bus.stop()
+    await mongo_manager.disconnect()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 app.include_router(endpoint_router)
@@ -36,50 +63,8 @@ app.include_router(
     tags=["auth"],
 )
 
-@app.get("/api/{full_path:path}")
-async def get_data(full_path: str,
-                   session: AsyncSession = Depends(get_async_session)):
-    path_list=  full_path.split("/")
-    print(path_list)
-    # Проверяем что путь содержит минимум 3 части
-    if len(path_list) < 3:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid path format. Expected: username/group/endpoint"
-        )
-    username = path_list[0]
-    group_name = path_list[1]
-    route_name = path_list[2]
-
-    # Простой запрос для получения endpoint_id
-    query = select(endpoint.c.id).where(
-        and_(
-            user.c.username == username,
-            group.c.endpoint == group_name,
-            endpoint.c.path == route_name,
-            user.c.id == group.c.user_id,
-            group.c.id == endpoint.c.group_id
-        )
-    )
-
-    result = await session.execute(query)
-    endpoint_id = result.scalar()
-
-    if not endpoint_id:
-        raise HTTPException(
-            status_code=404,
-            detail="Endpoint not found"
-        )
-
-    with MongoManager(MONGO_LINK, MONGO_BASE) as mongo:
-        data = mongo.find_one(username, endpoint_id)['data']
-
-    return data
-
-
-
-
-
+app.include_router(snapshot_router if MOCK_SNAPSHOT_PATH else mocks_router)
+app.include_router(metrics_router)
 
 origins = [
     "http://localhost:3000",
@@ -92,7 +77,9 @@ app.add_middleware(
     allow_methods=["GET", "POST", "OPTIONS", "DELETE", "PATCH", "PUT"],
     allow_headers=["Content-Type", "Set-Cookie", "Access-Control-Allow-Headers", "Access-Control-Allow-Origin",
                    "Authorization"],
+    expose_headers=["Server-Timing", "X-Total-Count", "Link"],
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/protected-route")
 def protected_route(user: User = Depends(current_user)):
@@ -0,0 +1,330 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter
+from starlette.responses import PlainTextResponse
+
+from src.config import METRICS_MULTIPROC_DIR, METRICS_EXPORT_INTERVAL
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def format_metric(name: str, kind: str, description: str, samples: Iterable[Sample]) -> List[str]:
+    """Текстовое представление метрики в формате Prometheus"""
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(sorted(labels.items()))} {value}")
+    return lines
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами и произвольными метками"""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, List] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in self._series.items():
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._histograms: List[Histogram] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def histogram(self, name: str, description: str, label_names: Sequence[str],
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        histogram = Histogram(name, description, label_names, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def collector(self, collect: Callable[[], List[str]]) -> Callable[[], List[str]]:
+        """Регистрация функции, которая отдает строки метрик в момент запроса /metrics"""
+        self._collectors.append(collect)
+        return collect
+
+    def render_worker(self) -> str:
+        """Метрики только текущего процесса"""
+        lines: List[str] = []
+        for histogram in self._histograms:
+            lines.extend(histogram.render())
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+    def render(self) -> str:
+        """Метрики всех воркеров из METRICS_MULTIPROC_DIR (или только текущего) с меткой worker"""
+        return merge_workers({str(os.getpid()): self.render_worker(), **read_worker_exports()})
+
+
+class WorkerExporter:
+    """
+    Периодическая выгрузка метрик воркера в METRICS_MULTIPROC_DIR.
+
+    У каждого воркера gunicorn свой registry, а /metrics обслуживает случайный воркер.
+    Поэтому воркеры раз в interval пишут свои метрики в файл <pid>.prom,
+    и /metrics объединяет их с метрикой текущего воркера (данные других - с задержкой до interval).
+    """
+
+    def __init__(self, registry: Registry, directory: str, interval: float):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{os.getpid()}.prom")
+
+    def start(self) -> None:
+        if self.directory and self._task is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Остановленный воркер больше не отдает метрики
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.export()
+            except OSError as e:
+                self.logger.error(f"Ошибка выгрузки метрик в {self.directory}: {e}")
+            await asyncio.sleep(self.interval)
+
+    def export(self) -> None:
+        # Файл в несколько килобайт на локальном диске: запись без отдельного потока.
+        # Подмена через os.replace - читатель не увидит файл недописанным
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.registry.render_worker())
+        os.replace(tmp_path, self.path)
+
+
+def read_worker_exports() -> Dict[str, str]:
+    """Выгруженные метрики других живых воркеров: pid -> текст"""
+    if not METRICS_MULTIPROC_DIR:
+        return {}
+    exports = {}
+    # Файл, который давно не обновлялся, оставил завершившийся воркер
+    stale_before = time.time() - 3 * METRICS_EXPORT_INTERVAL
+    try:
+        names = os.listdir(METRICS_MULTIPROC_DIR)
+    except OSError:
+        return {}
+    for name in names:
+        worker, extension = os.path.splitext(name)
+        if extension != ".prom" or worker == str(os.getpid()):
+            continue
+        path = os.path.join(METRICS_MULTIPROC_DIR, name)
+        try:
+            if os.path.getmtime(path) < stale_before:
+                continue
+            with open(path) as f:
+                exports[worker] = f.read()
+        except OSError:
+            continue
+    return exports
+
+
+def _with_label(sample: str, name: str, value: str) -> str:
+    series, _, number = sample.rpartition(" ")
+    if series.endswith("}"):
+        return f'{series[:-1]},{name}="{value}"}} {number}'
+    return f'{series}{{{name}="{value}"}} {number}'
+
+
+def merge_workers(texts: Dict[str, str]) -> str:
+    """
+    Объединение метрик нескольких воркеров в один ответ
+
+    В формате Prometheus строки HELP/TYPE семейства должны встречаться один раз, а его
+    образцы - идти подряд. Поэтому образцы группируются по семействам, и каждый получает
+    метку worker. Суммировать по воркерам нужно уже в запросе: sum without (worker) (...).
+    """
+    families: Dict[str, Tuple[List[str], List[str]]] = {}
+    for worker, text in texts.items():
+        family = None
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line.startswith("# "):
+                family = families.setdefault(line.split(" ", 3)[2], ([], []))
+                if len(family[0]) < 2 and line not in family[0]:
+                    family[0].append(line)
+            elif family is not None:
+                family[1].append(_with_label(line, "worker", worker))
+
+    lines: List[str] = []
+    for header, samples in families.values():
+        lines.extend(header)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+exporter = WorkerExporter(registry, METRICS_MULTIPROC_DIR, METRICS_EXPORT_INTERVAL)
+
+request_duration = registry.histogram(
+    "http_request_duration_seconds", "Длительность обработки HTTP-запроса", ("method", "route", "status"))
+stage_duration = registry.histogram(
+    "http_request_stage_duration_seconds", "Длительность этапов обработки запроса", ("route", "stage"))
+
+# Этапы текущего запроса: [(stage, seconds)], заполняются таймерами stage()/timed()
+_request_stages: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_stages", default=None)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((name, seconds))
+    else:
+        stage_duration.observe(seconds, "", name)
+
+
+@contextmanager
+def stage(name: str):
+    """Таймер этапа обработки запроса: with stage("sql"): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def timed(name: str):
+    """Декоратор-таймер для корутин, например методов AsyncMongoManager"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                record_stage(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware, которое измеряет длительность запросов и этапов.
+
+    Суммы этапов отдаются клиенту в заголовке Server-Timing и попадают
+    в гистограммы по маршруту, доступные на /metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages: List[Tuple[str, float]] = []
+        token = _request_stages.set(stages)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                totals = _sum_stages(stages)
+                totals["total"] = time.perf_counter() - started
+                header = ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in totals.items())
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stages.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            request_duration.observe(time.perf_counter() - started, scope["method"], route_path, str(status))
+            for name, seconds in _sum_stages(stages).items():
+                stage_duration.observe(seconds, route_path, name)
+
+
+def _sum_stages(stages: List[Tuple[str, float]]) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for name, seconds in stages:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return totals
+
+
+def cache_metrics(name: str, description: str, stats: Dict[str, int]) -> List[str]:
+    """Метрики кэша из TTLCache.stats()"""
+    lines = format_metric(f"{name}_size", "gauge", f"{description}: записей в кэше", [({}, stats["size"])])
+    for counter in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        lines.extend(format_metric(f"{name}_{counter}_total", "counter", f"{description}: {counter}",
+                                   [({}, stats[counter])]))
+    return lines
+
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+from typing import Dict, Hashable, Set, Tuple
+
+from src.cache import TTLCache
+from src.config import MOCK_CACHE_SIZE, MOCK_CACHE_TTL
+from src.invalidation import RESET, invalidation_bus
+from src.metrics import cache_metrics, registry
+from src.mocks.payloads import StoredPayload
+from src.mocks.trie import WILDCARD, normalize_path
+
+# (username, group endpoint, path, method)
+RouteKey = Tuple[str, str, str, str]
+
+
+@dataclass(frozen=True)
+class CachedRoute:
+    endpoint_id: int
+    payload: StoredPayload
+
+
+class RouteCache(TTLCache):
+    """
+    Кэш разрешенных маршрутов /api: ключ запроса -> endpoint_id и данные мока.
+
+    Дополнительно индексирует записи по группе и по endpoint_id,
+    чтобы изменения в группе или эндпоинте сбрасывали только затронутые ключи.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self._by_group: Dict[Tuple[str, str], Set[Hashable]] = {}
+        self._by_endpoint: Dict[int, Set[Hashable]] = {}
+
+    def invalidate_route(self, username: str, group_name: str, path: str, method: str) -> None:
+        self.pop((username, group_name, path, method.upper()))
+
+    def invalidate_endpoint(self, endpoint_id: int) -> None:
+        for key in list(self._by_endpoint.get(endpoint_id, ())):
+            self.pop(key)
+
+    def invalidate_group(self, username: str, group_name: str) -> None:
+        for key in list(self._by_group.get((username, group_name), ())):
+            self.pop(key)
+
+    def invalidate_user(self, username: str) -> None:
+        for group_key in [group_key for group_key in self._by_group if group_key[0] == username]:
+            self.invalidate_group(*group_key)
+
+    def _on_set(self, key: RouteKey, value: CachedRoute) -> None:
+        self._by_group.setdefault((key[0], key[1]), set()).add(key)
+        self._by_endpoint.setdefault(value.endpoint_id, set()).add(key)
+
+    def _on_remove(self, key: RouteKey, value: CachedRoute) -> None:
+        for index, index_key in ((self._by_group, (key[0], key[1])), (self._by_endpoint, value.endpoint_id)):
+            keys = index.get(index_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[index_key]
+
+
+route_cache = RouteCache(MOCK_CACHE_SIZE, MOCK_CACHE_TTL)
+registry.collector(lambda: cache_metrics("mock_route_cache", "Кэш маршрутов /api", route_cache.stats()))
+
+
+
+def _on_route(event):
+    # Литеральный маршрут влияет только на свой ключ, а шаблон с параметрами - на любой путь группы
+    if "{" in event["path"] or WILDCARD in event["path"]:
+        route_cache.invalidate_group(event["username"], event["group"])
+    else:
+        route_cache.invalidate_route(event["username"], event["group"], normalize_path(event["path"]),
+                                     event["method"])
+
+
+invalidation_bus.subscribe("route", _on_route)
+invalidation_bus.subscribe("endpoint", lambda event: route_cache.invalidate_endpoint(event["endpoint_id"]))
+invalidation_bus.subscribe("group", lambda event: route_cache.invalidate_group(event["username"], event["group"]))
+invalidation_bus.subscribe("user", lambda event: route_cache.invalidate_user(event["username"]))
+invalidation_bus.subscribe(RESET, lambda event: route_cache.clear())
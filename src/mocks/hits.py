@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import random
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import pymongo
+from pymongo import UpdateOne
+from starlette.requests import Request
+
+from src.config import (MOCK_HITS_BUFFER_SIZE, MOCK_HITS_FLUSH_INTERVAL, MOCK_HITS_SAMPLE_RATE,
+                        MOCK_HITS_SAMPLE_BYTES, MOCK_HITS_SAMPLE_TTL)
+from src.metrics import format_metric, registry
+from src.mongo import SERVICE_COLLECTION_PREFIX, AsyncMongoManager, mongo_manager
+
+# Накопленная статистика по эндпоинту (один документ на endpoint_id)
+STATS_COLLECTION = f"{SERVICE_COLLECTION_PREFIX}endpoint_stats"
+# Образцы запросов, удаляются по TTL-индексу
+SAMPLES_COLLECTION = f"{SERVICE_COLLECTION_PREFIX}endpoint_hits"
+
+# (username, endpoint_id, method, status, latency, at, sample)
+Hit = Tuple[str, int, str, int, float, datetime, Optional[Dict[str, Any]]]
+
+BODY_METHODS = {"POST", "PUT", "PATCH"}
+
+
+class HitRecorder:
+    """
+    Учет попаданий в моки без записи в MongoDB на горячем пути.
+
+    record() только добавляет попадание в кольцевой буфер ограниченного размера;
+    фоновая задача раз в flush_interval агрегирует накопленное по эндпоинтам
+    и пишет одним bulk_write ($inc с upsert) плюс insert_many для образцов запросов.
+    """
+
+    def __init__(self, mongo: AsyncMongoManager, capacity: int, flush_interval: float,
+                 sample_rate: float, sample_bytes: int):
+        self.mongo = mongo
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.sample_bytes = sample_bytes
+        self._buffer: Deque[Hit] = deque(maxlen=max(capacity, 1))
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def record(self, username: str, endpoint_id: int, method: str, status: int, latency: float,
+               sample: Optional[Dict[str, Any]] = None) -> None:
+        if not self.enabled:
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            # deque с maxlen сам вытесняет самое старое попадание
+            self.dropped += 1
+        self._buffer.append((username, endpoint_id, method, status, latency, datetime.now(timezone.utc), sample))
+        self.recorded += 1
+
+    async def sample(self, request: Request) -> Optional[Dict[str, Any]]:
+        """Образец запроса для небольшой доли попаданий (MOCK_HITS_SAMPLE_RATE)"""
+        if not self.enabled or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+
+        sample = {"query": str(request.query_params)[:self.sample_bytes]}
+        if request.method in BODY_METHODS:
+            body = await request.body()
+            sample["body"] = body[:self.sample_bytes].decode(errors="replace")
+            sample["body_size"] = len(body)
+        return sample
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # Остаток буфера сбрасываем при остановке воркера
+            await self.flush()
+
+    async def _run(self) -> None:
+        await self.mongo.create_index(STATS_COLLECTION, "endpoint_id", name="endpoint_id", unique=True)
+        await self.mongo.create_index(SAMPLES_COLLECTION, [("endpoint_id", pymongo.ASCENDING),
+                                                           ("at", pymongo.DESCENDING)], name="endpoint_id_at")
+        await self.mongo.create_index(SAMPLES_COLLECTION, "at", name="at_ttl",
+                                      expireAfterSeconds=MOCK_HITS_SAMPLE_TTL)
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                self.logger.error(f"Ошибка записи статистики попаданий: {e}")
+
+    async def flush(self) -> int:
+        """Запись накопленных попаданий; возвращает их количество"""
+        hits = [self._buffer.popleft() for _ in range(len(self._buffer))]
+        if not hits:
+            return 0
+
+        stats: Dict[int, Dict[str, Any]] = {}
+        samples: List[Dict[str, Any]] = []
+        for username, endpoint_id, method, status, latency, at, sample in hits:
+            item = stats.get(endpoint_id)
+            if item is None:
+                item = stats[endpoint_id] = {"username": username, "inc": {"count": 0, "latency_sum": 0.0},
+                                             "latency_max": 0.0, "first_hit_at": at, "last_hit_at": at}
+            inc = item["inc"]
+            inc["count"] += 1
+            inc["latency_sum"] += latency
+            inc[f"status.{status}"] = inc.get(f"status.{status}", 0) + 1
+            inc[f"methods.{method}"] = inc.get(f"methods.{method}", 0) + 1
+            item["latency_max"] = max(item["latency_max"], latency)
+            item["last_hit_at"] = at
+            if sample is not None:
+                samples.append({"endpoint_id": endpoint_id, "username": username, "method": method,
+                                "status": status, "latency": latency, "at": at, **sample})
+
+        operations = [
+            UpdateOne(
+                {"endpoint_id": endpoint_id},
+                {
+                    "$inc": item["inc"],
+                    "$max": {"latency_max": item["latency_max"], "last_hit_at": item["last_hit_at"]},
+                    "$min": {"first_hit_at": item["first_hit_at"]},
+                    "$setOnInsert": {"username": item["username"]},
+                },
+                upsert=True
+            )
+            for endpoint_id, item in stats.items()
+        ]
+        if not await self.mongo.bulk_write(STATS_COLLECTION, operations):
+            self.failed += len(hits)
+            return 0
+        if samples:
+            await self.mongo.insert_many(SAMPLES_COLLECTION, samples)
+
+        self.flushed += len(hits)
+        return len(hits)
+
+    def collect(self) -> List[str]:
+        lines = format_metric("mock_hits_buffered", "gauge", "Попадания в буфере, ожидающие записи",
+                              [({}, len(self._buffer))])
+        lines += format_metric("mock_hits_buffer_capacity", "gauge", "Размер буфера попаданий",
+                               [({}, self.capacity)])
+        for name, value, description in (
+                ("recorded", self.recorded, "Учтенные попадания"),
+                ("dropped", self.dropped, "Попадания, вытесненные из переполненного буфера"),
+                ("flushed", self.flushed, "Попадания, записанные в MongoDB"),
+                ("failed", self.failed, "Попадания, потерянные из-за ошибки записи")):
+            lines += format_metric(f"mock_hits_{name}_total", "counter", description, [({}, value)])
+        return lines
+
+
+async def load_stats(mongo: AsyncMongoManager, endpoint_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """Статистика эндпоинтов в виде для ответа API (без еще не сброшенных попаданий)"""
+    documents = await mongo.find_many(STATS_COLLECTION, list(endpoint_ids), {"_id": 0, "username": 0})
+    stats = {}
+    for document in documents:
+        count = document.get("count", 0)
+        stats[document["endpoint_id"]] = {
+            "count": count,
+            "status": document.get("status", {}),
+            "methods": document.get("methods", {}),
+            "latency_avg": document.get("latency_sum", 0.0) / count if count else None,
+            "latency_max": document.get("latency_max"),
+            "first_hit_at": document.get("first_hit_at"),
+            "last_hit_at": document.get("last_hit_at"),
+        }
+    return stats
+
+
+def empty_stats() -> Dict[str, Any]:
+    return {"count": 0, "status": {}, "methods": {}, "latency_avg": None, "latency_max": None,
+            "first_hit_at": None, "last_hit_at": None}
+
+
+async def load_samples(mongo: AsyncMongoManager, endpoint_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+    return await mongo.find(SAMPLES_COLLECTION, {"endpoint_id": endpoint_id},
+                            {"_id": 0, "endpoint_id": 0, "username": 0, "created_at": 0, "updated_at": 0},
+                            sort=[("at", pymongo.DESCENDING)], limit=limit)
+
+
+hit_recorder = HitRecorder(mongo_manager, MOCK_HITS_BUFFER_SIZE, MOCK_HITS_FLUSH_INTERVAL,
+                           MOCK_HITS_SAMPLE_RATE, MOCK_HITS_SAMPLE_BYTES)
+registry.collector(hit_recorder.collect)
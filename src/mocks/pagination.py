@@ -0,0 +1,153 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.datastructures import URL, QueryParams
+
+from src.config import MOCK_PAGE_SIZE, MOCK_PAGE_MAX_LIMIT
+
+WINDOW_PARAMS = ("_page", "_limit", "_offset", "_fields")
+# $slice требует положительное число элементов; "до конца массива" задается максимумом int32
+_SLICE_ALL = 2 ** 31 - 1
+
+
+@dataclass(frozen=True)
+class Window:
+    """Окно выдачи массива: смещение, размер и список полей элементов"""
+    offset: int = 0
+    limit: Optional[int] = None
+    fields: Optional[Tuple[str, ...]] = None
+    # Номер страницы, если окно задано через _page (для ссылок в Link)
+    page: Optional[int] = None
+
+
+def _int_param(params: QueryParams, name: str, minimum: int) -> Optional[int]:
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        number = None
+    if number is None or number < minimum:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Query parameter {name} must be an integer >= {minimum}"
+        )
+    return number
+
+
+def parse_window(params: QueryParams) -> Optional[Window]:
+    """Окно из параметров запроса; None, если ни один параметр пагинации не передан"""
+    if not any(name in params for name in WINDOW_PARAMS):
+        return None
+
+    page = _int_param(params, "_page", 1)
+    limit = _int_param(params, "_limit", 1)
+    offset = _int_param(params, "_offset", 0)
+    if page is not None and limit is None:
+        limit = MOCK_PAGE_SIZE
+    if limit is not None:
+        limit = min(limit, MOCK_PAGE_MAX_LIMIT)
+    if offset is None:
+        offset = (page - 1) * limit if page is not None else 0
+    else:
+        page = None
+
+    fields = None
+    if "_fields" in params:
+        fields = tuple(name for name in (part.strip() for part in params["_fields"].split(",")) if name)
+    return Window(offset=offset, limit=limit, fields=fields, page=page)
+
+
+def _project_fields(value: str, fields: Tuple[str, ...]) -> Dict[str, Any]:
+    # Поля верхнего уровня объекта; значения других типов остаются как есть
+    return {
+        "$cond": [
+            {"$eq": [{"$type": value}, "object"]},
+            {"$arrayToObject": {"$filter": {
+                "input": {"$objectToArray": value},
+                "as": "field",
+                "cond": {"$in": ["$$field.k", list(fields)]},
+            }}},
+            value,
+        ]
+    }
+
+
+def window_pipeline(match: Dict[str, Any], window: Window) -> List[Dict[str, Any]]:
+    """
+    Агрегация, которая вырезает окно массива data документа match на стороне MongoDB
+
+    Из базы уходит только запрошенный срез (с выбранными полями) и длина массива total.
+    У тел в GridFS и сжатых тел поля data нет: возвращается gridfs_id или blob, и окно считается в Python.
+    """
+    data = {"$slice": ["$data", window.offset, window.limit or _SLICE_ALL]}
+    if window.fields is not None:
+        data = {"$map": {"input": data, "as": "item", "in": _project_fields("$$item", window.fields)}}
+        whole = _project_fields("$data", window.fields)
+    else:
+        whole = "$data"
+
+    is_array = {"$isArray": "$data"}
+    return [
+        {"$match": match},
+        {"$limit": 1},
+        {"$project": {
+            "_id": 0,
+            "gridfs_id": 1,
+            "blob": 1,
+            "codec": 1,
+            "total": {"$cond": [is_array, {"$size": "$data"}, None]},
+            "data": {"$cond": [is_array, data, whole]},
+        }},
+    ]
+
+
+def apply_window(data: Any, window: Window) -> Tuple[Any, Optional[int]]:
+    """То же окно в Python - для тел, которые хранятся в GridFS"""
+    if not isinstance(data, list):
+        return _pick_fields(data, window.fields), None
+
+    end = window.offset + window.limit if window.limit is not None else None
+    items = data[window.offset:end]
+    if window.fields is not None:
+        items = [_pick_fields(item, window.fields) for item in items]
+    return items, len(data)
+
+
+def _pick_fields(value: Any, fields: Optional[Tuple[str, ...]]) -> Any:
+    if fields is None or not isinstance(value, dict):
+        return value
+    return {key: item for key, item in value.items() if key in fields}
+
+
+def pagination_headers(url: URL, window: Window, total: Optional[int]) -> Dict[str, str]:
+    """X-Total-Count и Link (first, prev, next, last) для окна массива"""
+    if total is None:
+        return {}
+
+    headers = {"X-Total-Count": str(total)}
+    if window.limit is None:
+        return headers
+
+    limit = window.limit
+    last = max((total - 1) // limit, 0) * limit
+    offsets = {"first": 0, "last": last}
+    if window.offset > 0:
+        offsets["prev"] = max(window.offset - limit, 0)
+    if window.offset + limit < total:
+        offsets["next"] = window.offset + limit
+
+    links = []
+    for rel in ("first", "prev", "next", "last"):
+        if rel not in offsets:
+            continue
+        if window.page is not None:
+            target = url.remove_query_params("_offset").include_query_params(
+                _page=offsets[rel] // limit + 1, _limit=limit)
+        else:
+            target = url.include_query_params(_offset=offsets[rel], _limit=limit)
+        links.append(f'<{target}>; rel="{rel}"')
+    headers["Link"] = ", ".join(links)
+    return headers
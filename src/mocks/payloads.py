@@ -0,0 +1,402 @@
+import gzip
+import hashlib
+import json
+import logging
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+from src.cache import TTLCache
+from src.config import (MOCK_GRIDFS_THRESHOLD, MOCK_COMPRESS_MIN_SIZE, MOCK_GZIP_LEVEL, MOCK_BROTLI_QUALITY,
+                        MOCK_PAYLOAD_CACHE_SIZE, MOCK_PAYLOAD_CACHE_TTL, MOCK_STORAGE_CODEC, MOCK_STORAGE_MIN_SIZE)
+from src.metrics import cache_metrics, registry, stage
+from src.mongo import SERVICE_COLLECTION_PREFIX, AsyncMongoManager
+
+# Общие тела моков: _id - хэш содержимого, refs - число эндпоинтов, которые на него ссылаются
+PAYLOADS_COLLECTION = f"{SERVICE_COLLECTION_PREFIX}payloads"
+
+# При отдаче /api исходное значение data не нужно: читаются готовые байты body (или сжатый blob)
+SERVING_PROJECTION = {"data": 0}
+
+# Кодек сжатого хранения тел; без zstd (Python < 3.14) используется zlib
+STORAGE_CODECS = ("zstd", "zlib")
+STORAGE_CODEC = MOCK_STORAGE_CODEC or None
+if STORAGE_CODEC == "zstd" and zstd is None:
+    logging.getLogger(__name__).warning("Модуль compression.zstd недоступен, тела сжимаются zlib")
+    STORAGE_CODEC = "zlib"
+if STORAGE_CODEC is not None and STORAGE_CODEC not in STORAGE_CODECS:
+    raise ValueError(f"MOCK_STORAGE_CODEC должен быть одним из {STORAGE_CODECS}")
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Время из документа MongoDB как aware datetime в UTC
+
+    Время пишется в UTC (datetime.now(timezone.utc)), а pymongo без tz_aware
+    возвращает его naive, уже в UTC: метка пояса только восстанавливается.
+    """
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def serialize(data: Any) -> bytes:
+    """JSON-представление тела мока (как у JSONResponse)"""
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def make_etag(body: bytes) -> str:
+    """Сильный ETag по содержимому тела"""
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def compress(body: bytes) -> Dict[str, bytes]:
+    """
+    Сжатые варианты тела (br, gzip), посчитанные один раз при записи эндпоинта
+
+    Варианты, которые не меньше исходного тела, не сохраняются.
+    """
+    if len(body) < MOCK_COMPRESS_MIN_SIZE:
+        return {}
+
+    variants = {"gzip": gzip.compress(body, compresslevel=MOCK_GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=MOCK_BROTLI_QUALITY)
+    return {encoding: variant for encoding, variant in variants.items() if len(variant) < len(body)}
+
+
+def pack_body(body: bytes, codec: str) -> bytes:
+    """Сжатие сериализованного тела для хранения в MongoDB"""
+    if codec == "zstd":
+        return zstd.compress(body)
+    if codec == "zlib":
+        return zlib.compress(body)
+    raise ValueError(f"Неизвестный кодек {codec}")
+
+
+def unpack_body(blob: bytes, codec: str) -> bytes:
+    """Готовые байты JSON из сжатого blob - без разбора в dict и повторной сериализации"""
+    if codec == "zstd":
+        if zstd is None:
+            raise RuntimeError("Тело сжато zstd, но модуль compression.zstd недоступен")
+        return zstd.decompress(blob)
+    if codec == "zlib":
+        return zlib.decompress(blob)
+    raise ValueError(f"Неизвестный кодек {codec}")
+
+
+def stored_fields(data: Any, body: bytes) -> Dict[str, Any]:
+    """
+    Поля документа с самим телом
+
+    Обычно это исходный data и готовые байты body. При включенном MOCK_STORAGE_CODEC тело
+    от MOCK_STORAGE_MIN_SIZE хранится только сжатым blob с тегом codec: вложенный BSON
+    не занимает диск и память MongoDB, а при чтении не разбирается в dict.
+    """
+    if STORAGE_CODEC is not None and len(body) >= MOCK_STORAGE_MIN_SIZE:
+        blob = pack_body(body, STORAGE_CODEC)
+        if len(blob) < len(body):
+            return {"blob": blob, "codec": STORAGE_CODEC}
+    return {"data": data, "body": body}
+
+
+@dataclass(frozen=True)
+class StoredPayload:
+    """
+    Тело мока, готовое к отдаче: сериализованные байты с ETag
+    или ссылка на файл в GridFS
+    """
+    body: Optional[bytes] = None
+    etag: Optional[str] = None
+    last_modified: Optional[datetime] = None
+    gridfs_id: Optional[ObjectId] = None
+    size: Optional[int] = None
+    # encoding -> сжатые байты (или (gridfs_id, size) для тел в GridFS)
+    encodings: Dict[str, Any] = field(default_factory=dict)
+    # Ключ общего тела в PAYLOADS_COLLECTION (None у старых документов с телом внутри)
+    key: Optional[str] = None
+
+    @property
+    def streamed(self) -> bool:
+        return self.gridfs_id is not None
+
+    def variant(self, encoding: Optional[str]) -> Tuple[Any, Optional[int], Optional[str]]:
+        """Тело (байты или gridfs_id), его размер и ETag для выбранного кодирования"""
+        if encoding is None:
+            return (self.gridfs_id, self.size, self.etag) if self.streamed else (self.body, len(self.body), self.etag)
+
+        # У каждого представления свой сильный ETag
+        etag = f'{self.etag[:-1]}-{encoding}"' if self.etag else None
+        variant = self.encodings[encoding]
+        if self.streamed:
+            return variant[0], variant[1], etag
+        return variant, len(variant), etag
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "StoredPayload":
+        last_modified = as_utc(document.get("updated_at"))
+        encodings = document.get("encodings") or {}
+        if document.get("gridfs_id") is not None:
+            return cls(etag=document.get("etag"), last_modified=last_modified,
+                       gridfs_id=document["gridfs_id"], size=document.get("size"),
+                       encodings={encoding: (variant["gridfs_id"], variant["size"])
+                                  for encoding, variant in encodings.items()})
+
+        body = document.get("body")
+        if body is None and document.get("blob") is not None:
+            with stage("decompress"):
+                body = unpack_body(document["blob"], document["codec"])
+        if body is None:
+            # Документы, созданные до появления body, сериализуются и сжимаются при первом чтении
+            with stage("serialize"):
+                body = serialize(document.get("data"))
+                encodings = compress(body)
+        return cls(body=bytes(body), etag=document.get("etag") or make_etag(body), last_modified=last_modified,
+                   encodings={encoding: bytes(variant) for encoding, variant in encodings.items()})
+
+
+# Общие тела по ключу: одна запись на все эндпоинты с одинаковым телом
+payload_cache = TTLCache(MOCK_PAYLOAD_CACHE_SIZE, MOCK_PAYLOAD_CACHE_TTL)
+registry.collector(lambda: cache_metrics("mock_payload_cache", "Кэш общих тел моков", payload_cache.stats()))
+
+
+def _payload_key(body: bytes) -> str:
+    """Ключ общего тела в PAYLOADS_COLLECTION - хэш сериализованного содержимого"""
+    return hashlib.sha256(body).hexdigest()
+
+
+async def _payload_document(mongo: AsyncMongoManager, key: str, data: Any, body: bytes) -> Dict[str, Any]:
+    """
+    Новое общее тело: готовые байты body, варианты encodings (gzip, br) и ETag
+
+    Тело больше MOCK_GRIDFS_THRESHOLD переносится в GridFS, в документе остается
+    ссылка gridfs_id и размер: так тело не упирается в лимит BSON 16 МБ и при отдаче читается потоком.
+    """
+    encodings = compress(body)
+    document = {"etag": make_etag(body), "size": len(body), "created_at": datetime.now(timezone.utc)}
+    if len(body) <= MOCK_GRIDFS_THRESHOLD:
+        document.update(stored_fields(data, body), encodings=encodings)
+        return document
+
+    filename = f"{key}.json"
+    file_id = await mongo.upload_file(filename, body, metadata={"payload": key})
+    if file_id is None:
+        document.update(stored_fields(data, body), encodings={})
+        return document
+
+    document["gridfs_id"] = file_id
+    document["encodings"] = {}
+    for encoding, variant in encodings.items():
+        variant_id = await mongo.upload_file(f"{filename}.{encoding}", variant,
+                                             metadata={"payload": key, "encoding": encoding})
+        if variant_id is not None:
+            document["encodings"][encoding] = {"gridfs_id": variant_id, "size": len(variant)}
+    return document
+
+
+async def store_payloads(mongo: AsyncMongoManager, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Подготовка документов эндпоинтов к записи
+
+    Тело хранится один раз в PAYLOADS_COLLECTION под ключом _id - хэшем содержимого,
+    а документ эндпоинта вместо data получает ссылку payload на этот ключ. Одинаковые тела
+    (клоны групп и эндпоинтов) не дублируются: у общего тела растет только счетчик ссылок refs.
+    Сериализация и сжатие выполняются один раз для нового тела; все тела пакета
+    записываются одним bulk_write.
+    """
+    if not documents:
+        return documents
+
+    bodies: Dict[str, Tuple[Any, bytes]] = {}
+    refs: Counter = Counter()
+    for document in documents:
+        body = serialize(document["data"])
+        key = _payload_key(body)
+        bodies.setdefault(key, (document["data"], body))
+        refs[key] += 1
+        document["payload"] = key
+
+    existing = await mongo.find(PAYLOADS_COLLECTION, {"_id": {"$in": list(refs)}}, {"_id": 1})
+    existing = {document["_id"] for document in existing}
+    operations = []
+    # Ключи, ссылки на которые уже учтены отдельным update_one
+    counted: Set[str] = set()
+    for key, count in refs.items():
+        data, body = bodies[key]
+        if key in existing and len(body) > MOCK_GRIDFS_THRESHOLD:
+            # Файл GridFS не передать в $setOnInsert без повторной загрузки: счетчик увеличивается
+            # без upsert, а если тело успели удалить после find, оно создается заново целиком
+            if await mongo.update_one(PAYLOADS_COLLECTION, {"_id": key}, {"$inc": {"refs": count}}):
+                counted.add(key)
+                continue
+            existing.discard(key)
+        if key not in existing:
+            on_insert = await _payload_document(mongo, key, data, body)
+        else:
+            # Тело могли удалить между find и записью: тогда upsert создаст его заново, хотя бы без сжатия
+            on_insert = {**stored_fields(data, body), "etag": make_etag(body), "size": len(body),
+                         "created_at": datetime.now(timezone.utc)}
+        # Каждый upsert несет тело целиком: при гонке двух записей $setOnInsert применится
+        # только у первой, и документ в любом случае создается полным
+        operations.append(UpdateOne({"_id": key}, {"$inc": {"refs": count}, "$setOnInsert": on_insert},
+                                    upsert=True))
+
+    if not await mongo.bulk_write(PAYLOADS_COLLECTION, operations):
+        # Общее хранилище недоступно: тело остается в документе эндпоинта, как до дедупликации
+        for document in documents:
+            if document["payload"] in counted:
+                del document["data"]
+                continue
+            body = bodies[document.pop("payload")][1]
+            document["body"] = body
+            document["etag"] = make_etag(body)
+        return documents
+
+    for document in documents:
+        del document["data"]
+    return documents
+
+
+async def store_payload(mongo: AsyncMongoManager, document: Dict[str, Any]) -> Dict[str, Any]:
+    """Подготовка одного документа эндпоинта к записи (см. store_payloads)"""
+    return (await store_payloads(mongo, [document]))[0]
+
+
+async def release_payloads(mongo: AsyncMongoManager, documents: Iterable[Dict[str, Any]]) -> None:
+    """
+    Освобождение тел удаленных эндпоинтов
+
+    Для общих тел уменьшается счетчик ссылок refs, тело без ссылок удаляется вместе с файлами GridFS.
+    Файлы старых документов с телом внутри принадлежат только своему эндпоинту и удаляются сразу.
+    """
+    refs: Counter = Counter()
+    for document in documents:
+        if document.get("payload") is not None:
+            refs[document["payload"]] += 1
+        else:
+            await _delete_files(mongo, document)
+    if not refs:
+        return
+
+    await mongo.bulk_write(PAYLOADS_COLLECTION, [UpdateOne({"_id": key}, {"$inc": {"refs": -count}})
+                                                 for key, count in refs.items()])
+    orphans = await mongo.find(PAYLOADS_COLLECTION, {"_id": {"$in": list(refs)}, "refs": {"$lte": 0}},
+                               {"gridfs_id": 1, "encodings": 1})
+    for orphan in orphans:
+        # Условие refs <= 0 повторяется: за это время тело могли снова сослаться
+        if await mongo.delete_one(PAYLOADS_COLLECTION, {"_id": orphan["_id"], "refs": {"$lte": 0}}):
+            payload_cache.pop(orphan["_id"])
+            await _delete_files(mongo, orphan)
+
+
+async def _delete_files(mongo: AsyncMongoManager, document: Dict[str, Any]) -> None:
+    if document.get("gridfs_id") is None:
+        return
+    await mongo.delete_file(document["gridfs_id"])
+    for variant in (document.get("encodings") or {}).values():
+        await mongo.delete_file(variant["gridfs_id"])
+
+
+async def load_payloads(mongo: AsyncMongoManager, collection: str,
+                        documents: Iterable[Dict[str, Any]]) -> Dict[int, StoredPayload]:
+    """
+    Тела для отдачи по документам эндпоинтов (endpoint_id -> StoredPayload)
+
+    Общие тела берутся из payload_cache, недостающие читаются одним $in по ключам:
+    эндпоинты с одинаковым телом делят одну запись кэша. Документы, созданные до появления
+    body, перечитываются целиком.
+    """
+    payloads: Dict[int, StoredPayload] = {}
+    missing: Dict[str, List[Dict[str, Any]]] = {}
+    legacy = []
+    for document in documents:
+        key = document.get("payload")
+        if key is None:
+            if any(name in document for name in ("body", "blob", "gridfs_id", "data")):
+                payloads[document["endpoint_id"]] = StoredPayload.from_document(document)
+            else:
+                legacy.append(document["endpoint_id"])
+            continue
+
+        shared = payload_cache.get(key)
+        if shared is None:
+            missing.setdefault(key, []).append(document)
+        else:
+            payloads[document["endpoint_id"]] = replace(shared, last_modified=as_utc(document.get("updated_at")))
+
+    if missing:
+        for stored in await mongo.find(PAYLOADS_COLLECTION, {"_id": {"$in": list(missing)}}, SERVING_PROJECTION):
+            shared = replace(StoredPayload.from_document(stored), key=stored["_id"], last_modified=None)
+            if not shared.streamed:
+                # Байты тела неизменны для своего ключа; ссылки на GridFS не кэшируются,
+                # потому что тело без ссылок удаляется и может быть загружено заново под другим gridfs_id
+                payload_cache.set(stored["_id"], shared)
+            for document in missing[stored["_id"]]:
+                payloads[document["endpoint_id"]] = replace(shared, last_modified=as_utc(document.get("updated_at")))
+
+    for document in await mongo.find_many(collection, legacy):
+        payloads[document["endpoint_id"]] = StoredPayload.from_document(document)
+    return payloads
+
+
+async def load_payload(mongo: AsyncMongoManager, collection: str,
+                       document: Dict[str, Any]) -> Optional[StoredPayload]:
+    """Тело для отдачи по одному документу эндпоинта (см. load_payloads)"""
+    return (await load_payloads(mongo, collection, [document])).get(document["endpoint_id"])
+
+
+async def find_serving_payload(mongo: AsyncMongoManager, collection: str,
+                               endpoint_id: int) -> Optional[StoredPayload]:
+    """Тело эндпоинта для отдачи: документ читается без data"""
+    document = await mongo.find_one(collection, endpoint_id, SERVING_PROJECTION)
+    return await load_payload(mongo, collection, document) if document is not None else None
+
+
+# Поля документа, из которых восстанавливается исходный data
+DATA_PROJECTION = {"data": 1, "gridfs_id": 1, "blob": 1, "codec": 1}
+
+
+async def decode_data(mongo: AsyncMongoManager, document: Dict[str, Any]) -> Any:
+    """Исходный data документа с телом: поле data, сжатый blob или файл GridFS"""
+    if document.get("gridfs_id") is not None:
+        body = await mongo.download_file(document["gridfs_id"])
+        return json.loads(body) if body is not None else None
+    if document.get("blob") is not None:
+        return json.loads(unpack_body(document["blob"], document["codec"]))
+    return document.get("data")
+
+
+async def load_data_many(mongo: AsyncMongoManager, documents: Iterable[Dict[str, Any]]) -> Dict[int, Any]:
+    """Тела моков целиком по документам эндпоинтов (для управляющих запросов, не для /api)"""
+    documents = list(documents)
+    keys = list({document["payload"] for document in documents if document.get("payload") is not None})
+    shared = {}
+    if keys:
+        stored = await mongo.find(PAYLOADS_COLLECTION, {"_id": {"$in": keys}}, DATA_PROJECTION)
+        shared = {document["_id"]: document for document in stored}
+
+    result = {}
+    for document in documents:
+        source = shared.get(document["payload"]) if document.get("payload") is not None else document
+        result[document["endpoint_id"]] = await decode_data(mongo, source) if source is not None else None
+    return result
+
+
+async def load_data(mongo: AsyncMongoManager, document: Dict[str, Any]) -> Any:
+    """Тело мока целиком (для управляющих запросов, не для /api)"""
+    return (await load_data_many(mongo, [document])).get(document["endpoint_id"])
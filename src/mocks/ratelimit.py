@@ -0,0 +1,131 @@
+import json
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import TTLCache
+from src.config import (MOCK_RATE_LIMIT_RPS, MOCK_RATE_LIMIT_BURST, MOCK_RATE_LIMIT_OVERRIDES,
+                        MOCK_ROUTING_USERS, MOCK_ROUTING_TTL)
+from src.invalidation import RESET, invalidation_bus
+from src.metrics import format_metric, registry
+from src.mocks.routing import routing_table
+from src.mocks.trie import RouteTrie
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """Списание одного токена: 0 - запрос разрешен, иначе секунды до появления токена"""
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Лимит запросов к /api на пользователя-владельца моков.
+
+    Корзина пользователя живет в памяти воркера и заводится до разрешения маршрута (load),
+    поэтому токен расходует любой запрос к существующему пользователю, в том числе
+    закончившийся 404 или 405. Существование пользователя и права его роли берутся
+    из таблицы маршрутов: один запрос к Postgres на пользователя за время жизни корзины,
+    несуществующие имена запоминаются в ее отрицательном кэше, и корзин для них не создается.
+    Лимит берется из переопределений для пользователя, затем из role.permissions,
+    затем из значений по умолчанию. Пользователю без лимита достается корзина с rps 0,
+    чтобы лимит не вычислялся заново до истечения ее срока жизни.
+    """
+
+    def __init__(self, rate: float, burst: float, overrides: Dict[str, Dict[str, float]],
+                 maxsize: int, ttl: float):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = overrides
+        self._buckets = TTLCache(maxsize, ttl)
+        self.allowed = 0
+        self.rejected = 0
+
+    async def load(self, session: AsyncSession, usernames: Iterable[str]) -> None:
+        """Корзины существующих пользователей; недостающие заводятся одним запросом к таблице маршрутов"""
+        missing = [username for username in dict.fromkeys(usernames) if username not in self._buckets]
+        if not missing:
+            return
+        tries = await routing_table.get_many(session, missing)
+        for username, trie in tries.items():
+            # Параллельный запрос мог уже завести корзину и списать из нее токен
+            if username not in self._buckets:
+                self._buckets.set(username, TokenBucket(*self._limit(username, trie)))
+
+    def take(self, username: str) -> float:
+        """Списание токена из корзины пользователя: 0 - запрос разрешен (в том числе без корзины)"""
+        bucket = self._buckets.get(username)
+        retry_after = bucket.take(time.monotonic()) if bucket is not None else 0.0
+        if retry_after:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    async def check(self, session: AsyncSession, username: str) -> None:
+        """Проверка лимита перед разрешением маршрута; при превышении - 429 с Retry-After"""
+        await self.load(session, [username])
+        retry_after = self.take(username)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+    def _limit(self, username: str, trie: Optional[RouteTrie]) -> tuple[float, float]:
+        limit = self.overrides.get(username)
+        if limit is None and trie is not None and isinstance(trie.permissions, dict):
+            limit = trie.permissions.get("rate_limit")
+        limit = limit if isinstance(limit, dict) else {}
+        rate = float(limit.get("rps", self.rate) or 0)
+        return rate, float(limit.get("burst", self.burst) or rate)
+
+    def drop_user(self, username: str) -> None:
+        self._buckets.pop(username)
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+    def collect(self) -> List[str]:
+        lines = format_metric("mock_rate_limit_buckets", "gauge", "Корзины лимита запросов в памяти",
+                              [({}, len(self._buckets))])
+        lines += format_metric("mock_rate_limit_allowed_total", "counter", "Запросы /api, пропущенные лимитом",
+                               [({}, self.allowed)])
+        lines += format_metric("mock_rate_limit_rejected_total", "counter", "Запросы /api, отклоненные с 429",
+                               [({}, self.rejected)])
+        return lines
+
+
+def _load_overrides(raw: str) -> Dict[str, Dict[str, Any]]:
+    overrides = json.loads(raw or "{}")
+    if not isinstance(overrides, dict):
+        raise ValueError("MOCK_RATE_LIMIT_OVERRIDES должен быть JSON-объектом {username: {rps, burst}}")
+    return overrides
+
+
+rate_limiter = RateLimiter(MOCK_RATE_LIMIT_RPS, MOCK_RATE_LIMIT_BURST, _load_overrides(MOCK_RATE_LIMIT_OVERRIDES),
+                           MOCK_ROUTING_USERS, MOCK_ROUTING_TTL)
+registry.collector(rate_limiter.collect)
+
+# Права роли могли измениться: корзина пересоздается при следующем запросе
+invalidation_bus.subscribe("user", lambda event: rate_limiter.drop_user(event["username"]))
+invalidation_bus.subscribe(RESET, lambda event: rate_limiter.clear())
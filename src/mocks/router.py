@@ -0,0 +1,348 @@
+import asyncio
+import math
+import time
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pymongo.errors import PyMongoError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import MOCK_BATCH_MAX_ITEMS, MOCK_RESOLVE_MODE
+from src.database import get_async_session
+from src.metrics import stage
+from src.mocks.cache import CachedRoute, route_cache
+from src.mocks.hits import hit_recorder
+from src.mocks.pagination import Window, apply_window, pagination_headers, parse_window, window_pipeline
+from src.mocks.payloads import (DATA_PROJECTION, PAYLOADS_COLLECTION, SERVING_PROJECTION, StoredPayload, decode_data,
+                                find_serving_payload, load_payload, load_payloads, serialize)
+from src.mocks.ratelimit import rate_limiter
+from src.mocks.routing import routing_table
+from src.mocks.schemas import BatchItem
+from src.mocks.trie import MethodNotAllowed, split_path
+from src.mongo import AsyncMongoManager, get_mongo
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Mock"]
+)
+
+MOCK_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE"]
+# При равном q предпочитаем brotli: он сжимает JSON плотнее
+PREFERRED_ENCODINGS = ("br", "gzip")
+
+
+# Объявлен раньше общего маршрута /{full_path:path}, который иначе перехватил бы POST
+@router.post("/_batch")
+async def get_batch(items: List[BatchItem],
+                    session: AsyncSession = Depends(get_async_session),
+                    mongo: AsyncMongoManager = Depends(get_mongo)):
+    """
+    Разрешение пачки моков за один запрос
+
+    Маршруты всех пользователей разрешаются одним SQL-запросом (для еще не загруженных
+    деревьев), тела читаются одним $in на коллекцию пользователя. Ответ - массив
+    в порядке запроса со статусом каждого элемента.
+    """
+    if len(items) > MOCK_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Не больше {MOCK_BATCH_MAX_ITEMS} запросов в пачке")
+
+    started = time.perf_counter()
+    results: List[Optional[bytes]] = [None] * len(items)
+    payloads: Dict[int, StoredPayload] = {}
+    # index -> (username, endpoint_id) разрешенных элементов, для учета попаданий
+    resolved: Dict[int, Tuple[str, int]] = {}
+    pending: Dict[int, Tuple[tuple, List[str]]] = {}
+    paths = [split_path(item.path) for item in items]
+    # Корзины владельцев заводятся до разрешения маршрутов, чтобы промахи тоже расходовали токены
+    await rate_limiter.load(session, (path_list[0] for path_list in paths if len(path_list) >= 3))
+    with stage("cache"):
+        for index, (item, path_list) in enumerate(zip(items, paths)):
+            if len(path_list) < 3:
+                results[index] = _batch_result(item, 400,
+                                               detail="Invalid path format. Expected: username/group/endpoint")
+                continue
+            # Каждый элемент пачки расходует токен лимита своего владельца
+            retry_after = rate_limiter.take(path_list[0])
+            if retry_after:
+                results[index] = _batch_result(item, 429, detail="Rate limit exceeded",
+                                               retry_after=math.ceil(retry_after))
+                continue
+            cache_key = (path_list[0], path_list[1], "/".join(path_list[2:]), item.method.upper())
+            cached = route_cache.get(cache_key)
+            if cached is not None:
+                payloads[index] = cached.payload
+                resolved[index] = (cache_key[0], cached.endpoint_id)
+            else:
+                pending[index] = (cache_key, path_list[2:])
+
+    matches: Dict[str, Dict[int, int]] = {}
+    if pending:
+        with stage("route"):
+            tries = await routing_table.get_many(session, (cache_key[0] for cache_key, _ in pending.values()))
+            for index, (cache_key, segments) in pending.items():
+                username, group_name, _, method = cache_key
+                trie = tries.get(username)
+                try:
+                    match = trie.match(group_name, segments, method) if trie is not None else None
+                except MethodNotAllowed as e:
+                    results[index] = _batch_result(items[index], 405, detail="Method not allowed", allow=e.allowed)
+                    continue
+                if match is None:
+                    results[index] = _batch_result(items[index], 404, detail="Endpoint not found")
+                    continue
+                matches.setdefault(username, {})[index] = match.endpoint_id
+
+    found = await asyncio.gather(*(
+        _find_serving_payloads(mongo, username, set(user_matches.values()))
+        for username, user_matches in matches.items()
+    ))
+    for (username, user_matches), user_payloads in zip(matches.items(), found):
+        for index, endpoint_id in user_matches.items():
+            payload = user_payloads.get(endpoint_id)
+            if payload is None:
+                results[index] = _batch_result(items[index], 404, detail="Endpoint not found")
+                continue
+            route_cache.set(pending[index][0], CachedRoute(endpoint_id, payload))
+            payloads[index] = payload
+            resolved[index] = (username, endpoint_id)
+
+    for index, payload in payloads.items():
+        body = await mongo.download_file(payload.gridfs_id) if payload.streamed else payload.body
+        if body is None:
+            status = 404
+            results[index] = _batch_result(items[index], status, detail="Endpoint payload not found")
+        else:
+            status = 200
+            results[index] = _batch_result(items[index], status, body=body, etag=payload.etag)
+        username, endpoint_id = resolved[index]
+        hit_recorder.record(username, endpoint_id, items[index].method.upper(), status,
+                            time.perf_counter() - started)
+
+    # Тела уже сериализованы: ответ собирается из готовых байтов без повторного json.dumps
+    return Response(content=b"[" + b",".join(results) + b"]", media_type="application/json")
+
+
+async def _find_serving_payloads(mongo: AsyncMongoManager, username: str,
+                                 endpoint_ids) -> Dict[int, StoredPayload]:
+    documents = await mongo.find_many(username, list(endpoint_ids), SERVING_PROJECTION)
+    return await load_payloads(mongo, username, documents)
+
+
+def _batch_result(item: BatchItem, status: int, body: Optional[bytes] = None, **fields) -> bytes:
+    result = serialize({"method": item.method.upper(), "path": item.path, "status": status, **fields})
+    if body is None:
+        return result
+    return result[:-1] + b',"body":' + bytes(body) + b"}"
+
+
+@router.api_route("/{full_path:path}", methods=MOCK_METHODS)
+async def get_data(full_path: str,
+                   request: Request,
+                   session: AsyncSession = Depends(get_async_session),
+                   mongo: AsyncMongoManager = Depends(get_mongo)):
+    started = time.perf_counter()
+    path_list = split_path(full_path)
+    # Проверяем что путь содержит минимум 3 части
+    if len(path_list) < 3:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid path format. Expected: username/group/endpoint"
+        )
+
+    # Лимит владельца моков проверяется до разрешения маршрута: 404 и 405 тоже расходуют токены
+    await rate_limiter.check(session, path_list[0])
+    endpoint_id, response = await _serve(request, session, mongo, path_list)
+    # Попадание только кладется в кольцевой буфер, в MongoDB его пишет фоновая задача
+    hit_recorder.record(path_list[0], endpoint_id, request.method, response.status_code,
+                        time.perf_counter() - started, await hit_recorder.sample(request))
+    return response
+
+
+async def _serve(request: Request, session: AsyncSession, mongo: AsyncMongoManager,
+                 path_list: List[str]) -> Tuple[int, Response]:
+    """Разрешение маршрута и ответ мока: (endpoint_id, ответ)"""
+    username = path_list[0]
+    group_name = path_list[1]
+    route_segments = path_list[2:]
+    route_name = "/".join(route_segments)
+    # _page/_limit/_offset/_fields: отдается только окно массива, вырезанное в MongoDB
+    window = parse_window(request.query_params)
+
+    # Повторные запросы отдаем из кэша, не обращаясь ни к Postgres, ни к MongoDB
+    cache_key = (username, group_name, route_name, request.method)
+    with stage("cache"):
+        cached = route_cache.get(cache_key)
+    if cached is not None:
+        if window is not None:
+            return cached.endpoint_id, await _render_window(request, mongo, username, cached.endpoint_id, window,
+                                                            cached.payload.key)
+        return cached.endpoint_id, await render_payload(request, mongo, cached.payload)
+
+    if MOCK_RESOLVE_MODE == "mongo":
+        # Ключ разрешения хранится в самом документе, Postgres не нужен.
+        # Шаблоны с параметрами так не найти, для них ниже используется таблица маршрутов
+        projection = {"endpoint_id": 1, "payload": 1} if window is not None else SERVING_PROJECTION
+        document = await mongo.find_by_lookup(username, username, group_name, route_name, request.method,
+                                              projection)
+        if document and window is not None:
+            endpoint_id = document['endpoint_id']
+            return endpoint_id, await _render_window(request, mongo, username, endpoint_id, window,
+                                                     document.get("payload"))
+        payload = await load_payload(mongo, username, document) if document else None
+        if payload is not None:
+            route_cache.set(cache_key, CachedRoute(document['endpoint_id'], payload))
+            return document['endpoint_id'], await render_payload(request, mongo, payload)
+
+    # Маршрут ищется в дереве пользователя в памяти; Postgres нужен только при первом обращении
+    try:
+        with stage("route"):
+            trie = await routing_table.get(session, username)
+            match = trie.match(group_name, route_segments, request.method) if trie is not None else None
+    except MethodNotAllowed as e:
+        raise HTTPException(
+            status_code=405,
+            detail="Method not allowed",
+            headers={"Allow": ", ".join(e.allowed)}
+        )
+
+    if match is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Endpoint not found"
+        )
+
+    if window is not None:
+        return match.endpoint_id, await _render_window(request, mongo, username, match.endpoint_id, window)
+
+    payload = await find_serving_payload(mongo, username, match.endpoint_id)
+    if payload is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Endpoint not found"
+        )
+
+    route_cache.set(cache_key, CachedRoute(match.endpoint_id, payload))
+
+    return match.endpoint_id, await render_payload(request, mongo, payload)
+
+
+async def render_payload(request: Request, mongo: Optional[AsyncMongoManager], payload: StoredPayload) -> Response:
+    encoding = _choose_encoding(request.headers.get("accept-encoding"), payload.encodings)
+    content, size, etag = payload.variant(encoding)
+
+    headers = {}
+    if etag:
+        headers["ETag"] = etag
+    if payload.last_modified:
+        headers["Last-Modified"] = format_datetime(payload.last_modified, usegmt=True)
+    if payload.encodings:
+        headers["Vary"] = "Accept-Encoding"
+
+    if request.method == "GET" and _not_modified(request, etag, payload.last_modified):
+        return Response(status_code=304, headers=headers)
+
+    # Сжатые варианты посчитаны при записи эндпоинта, здесь только выбирается нужный
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+
+    if payload.streamed:
+        # Большие тела идут из GridFS по чанкам: память на запрос не зависит от размера мока
+        chunks = await mongo.open_file(content)
+        if chunks is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Endpoint payload not found"
+            )
+        if size is not None:
+            headers["Content-Length"] = str(size)
+        return StreamingResponse(chunks, media_type="application/json", headers=headers)
+
+    # Тело сериализовано при записи эндпоинта, здесь отдаются готовые байты
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+async def _render_window(request: Request, mongo: AsyncMongoManager, collection: str,
+                         endpoint_id: int, window: Window, key: Optional[str] = None) -> Response:
+    if key is None:
+        reference = await mongo.find_one(collection, endpoint_id, {"_id": 0, "payload": 1})
+        if reference is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Endpoint not found"
+            )
+        key = reference.get("payload")
+
+    # Общее тело вырезается в PAYLOADS_COLLECTION, старые документы - в коллекции пользователя
+    if key is not None:
+        collection, match = PAYLOADS_COLLECTION, {"_id": key}
+    else:
+        match = {"endpoint_id": endpoint_id}
+    try:
+        document = await mongo.aggregate_one(collection, window_pipeline(match, window))
+        sliced = True
+    except PyMongoError:
+        # Агрегация не выполнилась (ошибка уже записана в лог): окно вырезается из тела целиком
+        found = await mongo.find(collection, match, DATA_PROJECTION, limit=1)
+        document = found[0] if found else None
+        sliced = False
+    if document is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Endpoint not found"
+        )
+
+    if not sliced or document.get("gridfs_id") is not None or document.get("blob") is not None:
+        # Тело в GridFS или сжатое не разобрать на стороне базы: окно вырезается после загрузки
+        data, total = apply_window(await decode_data(mongo, document), window)
+    else:
+        data, total = document.get("data"), document.get("total")
+
+    headers = pagination_headers(request.url, window, total)
+    return Response(content=serialize(data), media_type="application/json", headers=headers)
+
+
+def _choose_encoding(accept_encoding: Optional[str], available) -> Optional[str]:
+    """Выбор сжатого варианта по Accept-Encoding с учетом q; None - отдать как есть"""
+    if not accept_encoding or not available:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in PREFERRED_ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if encoding in available and weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def _not_modified(request: Request, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if not etag:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        modified = last_modified.replace(microsecond=0)
+        return since.tzinfo is not None and modified <= since
+    return False
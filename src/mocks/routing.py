@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import role, user
+from src.cache import TTLCache
+from src.config import MOCK_ROUTING_USERS, MOCK_ROUTING_TTL
+from src.endpoints.models import endpoint
+from src.groups.models import group
+from src.invalidation import RESET, invalidation_bus
+from src.metrics import cache_metrics, registry
+from src.mocks.trie import RouteTrie
+
+# Запрос строится один раз при импорте: SQLAlchemy берет его компиляцию из кэша,
+# а asyncpg - подготовленное выражение из кэша соединения (DB_STATEMENT_CACHE_SIZE).
+# LEFT JOIN: права роли нужны и пользователю без групп и эндпоинтов
+ROUTES_QUERY = select(
+    user.c.username, role.c.permissions,
+    endpoint.c.id, endpoint.c.path, endpoint.c.method, group.c.endpoint.label("group")
+).select_from(
+    user.outerjoin(role, role.c.id == user.c.role_id)
+    .outerjoin(group, group.c.user_id == user.c.id)
+    .outerjoin(endpoint, endpoint.c.group_id == group.c.id)
+).where(user.c.username.in_(bindparam("usernames", expanding=True)))
+
+
+class RoutingTable:
+    """
+    Скомпилированные таблицы маршрутов пользователей.
+
+    Дерево пользователя строится запросом к таблице endpoint при первом обращении
+    (деревья нескольких пользователей - одним запросом),
+    а затем обновляется точечно по событиям шины инвалидации.
+    Для несуществующих пользователей дерево не строится: их имена запоминаются
+    в отдельном ограниченном кэше, чтобы запросы с произвольными именами
+    не вытесняли деревья настоящих пользователей и не ходили в Postgres каждый раз.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._tries = TTLCache(maxsize, ttl)
+        self._unknown = TTLCache(maxsize, ttl)
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._stale: Set[str] = set()
+        self.logger = logging.getLogger(__name__)
+
+    async def get(self, session: AsyncSession, username: str) -> Optional[RouteTrie]:
+        """Дерево пользователя; None, если такого пользователя нет"""
+        return (await self.get_many(session, [username])).get(username)
+
+    async def get_many(self, session: AsyncSession, usernames: Iterable[str]) -> Dict[str, RouteTrie]:
+        """
+        Деревья нескольких пользователей; отсутствующие в кэше строятся одним запросом
+
+        Несуществующих пользователей в результате нет.
+        """
+        tries: Dict[str, RouteTrie] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        missing: List[str] = []
+        for username in dict.fromkeys(usernames):
+            trie = self._tries.get(username)
+            if trie is not None:
+                tries[username] = trie
+            elif username in self._unknown:
+                continue
+            elif username in self._loading:
+                # Параллельные запросы к одному пользователю ждут одну загрузку
+                waiting[username] = self._loading[username]
+            else:
+                missing.append(username)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            loading = {username: loop.create_future() for username in missing}
+            self._loading.update(loading)
+            try:
+                loaded = await self._load(session, missing)
+                for username in missing:
+                    trie = loaded.get(username)
+                    # Если за время загрузки пришло событие, дерево могло устареть: отдаем, но не кэшируем
+                    if username not in self._stale:
+                        if trie is None:
+                            self._unknown.set(username, True)
+                        else:
+                            self._tries.set(username, trie)
+                    loading[username].set_result(trie)
+                tries.update(loaded)
+            except Exception as e:
+                for future in loading.values():
+                    future.set_exception(e)
+                    # Исключение получат ожидающие запросы, а сам future помечаем обработанным
+                    future.exception()
+                raise
+            finally:
+                for username in missing:
+                    del self._loading[username]
+                    self._stale.discard(username)
+
+        for username, future in waiting.items():
+            trie = await asyncio.shield(future)
+            if trie is not None:
+                tries[username] = trie
+        return tries
+
+    def peek(self, username: str) -> Optional[RouteTrie]:
+        """Уже загруженное дерево пользователя без обращения к Postgres"""
+        return self._tries.peek(username)
+
+    async def _load(self, session: AsyncSession, usernames: List[str]) -> Dict[str, RouteTrie]:
+        result = await session.execute(ROUTES_QUERY, {"usernames": usernames})
+
+        tries = {}
+        for row in result:
+            trie = tries.get(row.username)
+            if trie is None:
+                trie = tries[row.username] = RouteTrie(row.permissions)
+            if row.id is not None:
+                trie.insert(row.group, row.path, row.method, row.id)
+        for username, trie in tries.items():
+            self.logger.info(f"Таблица маршрутов {username} построена: {len(trie)} эндпоинтов")
+        return tries
+
+    def _peek_changed(self, username: str):
+        """Дерево пользователя, которого коснулось событие; идущая загрузка помечается устаревшей"""
+        if username in self._loading:
+            self._stale.add(username)
+        return self._tries.peek(username)
+
+    def add_route(self, username: str, group_name: str, path: str, method: str, endpoint_id: int) -> None:
+        trie = self._peek_changed(username)
+        if trie is not None:
+            trie.insert(group_name, path, method, endpoint_id)
+
+    def remove_endpoint(self, username: str, endpoint_id: int) -> None:
+        trie = self._peek_changed(username)
+        if trie is not None:
+            trie.remove(endpoint_id)
+
+    def drop_user(self, username: str) -> None:
+        self._peek_changed(username)
+        self._tries.pop(username)
+        self._unknown.pop(username)
+
+    def clear(self) -> None:
+        self._stale.update(self._loading)
+        self._tries.clear()
+        self._unknown.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self._tries.stats()
+
+
+routing_table = RoutingTable(MOCK_ROUTING_USERS, MOCK_ROUTING_TTL)
+registry.collector(lambda: cache_metrics("mock_routing_table", "Таблицы маршрутов пользователей",
+                                         routing_table.stats()))
+
+
+def _on_route(event):
+    if "endpoint_id" in event:
+        routing_table.add_route(event["username"], event["group"], event["path"], event["method"],
+                                event["endpoint_id"])
+    else:
+        routing_table.drop_user(event["username"])
+
+
+invalidation_bus.subscribe("route", _on_route)
+invalidation_bus.subscribe("endpoint", lambda event: routing_table.remove_endpoint(
+    event["username"], event["endpoint_id"]))
+# Группа могла быть переименована или удалена: ее поддерево строим заново при следующем обращении
+invalidation_bus.subscribe("group", lambda event: routing_table.drop_user(event["username"]))
+invalidation_bus.subscribe("user", lambda event: routing_table.drop_user(event["username"]))
+invalidation_bus.subscribe(RESET, lambda event: routing_table.clear())
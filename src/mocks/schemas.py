@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+
+
+class BatchItem(BaseModel):
+    method: str = "GET"
+    path: str
@@ -0,0 +1,172 @@
+import json
+import logging
+import mmap
+import struct
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from src.metrics import stage
+from src.mocks.pagination import apply_window, pagination_headers, parse_window
+from src.mocks.payloads import StoredPayload, as_utc, serialize
+from src.mocks.router import MOCK_METHODS, render_payload
+from src.mocks.trie import MethodNotAllowed, RouteMatch, RouteTrie, split_path
+
+# Формат файла снимка:
+#   заголовок HEADER: магическая строка, версия, смещение и длина индекса
+#   тела моков и их сжатые варианты, записанные подряд
+#   индекс: JSON со списком маршрутов и ссылками (смещение, длина) на тела
+MAGIC = b"MOCKSNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sIQQ")
+
+
+class SnapshotWriter:
+    """Последовательная запись снимка: тела пишутся сразу, индекс - в конце файла"""
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+        self._routes: List[Dict[str, Any]] = []
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def _write(self, data: bytes) -> List[int]:
+        offset = self._file.tell()
+        self._file.write(data)
+        return [offset, len(data)]
+
+    def add(self, username: str, group: str, path: str, method: str, endpoint_id: int,
+            body: bytes, etag: Optional[str], last_modified: Optional[datetime],
+            encodings: Dict[str, bytes]) -> None:
+        self._routes.append({
+            "username": username,
+            "group": group,
+            "path": path,
+            "method": method.upper(),
+            "endpoint_id": endpoint_id,
+            "etag": etag,
+            "last_modified": last_modified.isoformat() if last_modified else None,
+            "body": self._write(body),
+            "encodings": {encoding: self._write(variant) for encoding, variant in encodings.items()},
+        })
+
+    def finish(self) -> None:
+        index = json.dumps({"routes": self._routes}, ensure_ascii=False, separators=(",", ":")).encode()
+        index_offset = self._file.tell()
+        self._file.write(index)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, index_offset, len(index)))
+        self._file.flush()
+
+
+class Snapshot:
+    """
+    Снимок моков, открытый через mmap.
+
+    В памяти процесса остаются только деревья маршрутов и ссылки на участки файла;
+    сами тела читаются из страничного кэша ОС, который воркеры делят между собой.
+    """
+
+    def __init__(self):
+        self._file: Optional[BinaryIO] = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._tries: Dict[str, RouteTrie] = {}
+        self._payloads: Dict[int, StoredPayload] = {}
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def loaded(self) -> bool:
+        return self._mmap is not None
+
+    def open(self, path: str) -> None:
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, version, index_offset, index_length = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path}: неподдерживаемый формат снимка")
+
+        index = json.loads(view[index_offset:index_offset + index_length].tobytes())
+        for route in index["routes"]:
+            trie = self._tries.setdefault(route["username"], RouteTrie())
+            trie.insert(route["group"], route["path"], route["method"], route["endpoint_id"])
+
+            offset, length = route["body"]
+            last_modified = route["last_modified"]
+            self._payloads[route["endpoint_id"]] = StoredPayload(
+                body=view[offset:offset + length],
+                etag=route["etag"],
+                last_modified=as_utc(datetime.fromisoformat(last_modified)) if last_modified else None,
+                encodings={encoding: view[offset:offset + length]
+                           for encoding, (offset, length) in route["encodings"].items()},
+            )
+        self.logger.info(f"Снимок {path} загружен: {len(self._payloads)} эндпоинтов")
+
+    def close(self) -> None:
+        self._tries = {}
+        self._payloads = {}
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Ответы, которые еще держат участки файла, освободят их сами
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def match(self, username: str, group: str, segments: Sequence[str], method: str) -> Optional[RouteMatch]:
+        trie = self._tries.get(username)
+        return trie.match(group, segments, method) if trie is not None else None
+
+    def payload(self, endpoint_id: int) -> StoredPayload:
+        return self._payloads[endpoint_id]
+
+
+snapshot = Snapshot()
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Mock"]
+)
+
+
+@router.api_route("/{full_path:path}", methods=MOCK_METHODS)
+async def get_snapshot_data(full_path: str, request: Request):
+    path_list = split_path(full_path)
+    if len(path_list) < 3:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid path format. Expected: username/group/endpoint"
+        )
+
+    try:
+        with stage("route"):
+            match = snapshot.match(path_list[0], path_list[1], path_list[2:], request.method)
+    except MethodNotAllowed as e:
+        raise HTTPException(
+            status_code=405,
+            detail="Method not allowed",
+            headers={"Allow": ", ".join(e.allowed)}
+        )
+
+    if match is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Endpoint not found"
+        )
+
+    payload = snapshot.payload(match.endpoint_id)
+    window = parse_window(request.query_params)
+    if window is not None:
+        data, total = apply_window(json.loads(bytes(payload.body)), window)
+        return Response(content=serialize(data), media_type="application/json",
+                        headers=pagination_headers(request.url, window, total))
+
+    return await render_payload(request, None, payload)
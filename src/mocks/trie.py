@@ -0,0 +1,172 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+WILDCARD = "*"
+
+
+def split_path(path: str) -> List[str]:
+    """Разбиение пути эндпоинта или запроса на сегменты без пустых частей"""
+    return [segment for segment in path.strip("/").split("/") if segment]
+
+
+def normalize_path(path: str) -> str:
+    """Путь без начального, конечного и повторных "/" - в таком виде он хранится в ключе разрешения"""
+    return "/".join(split_path(path))
+
+
+@dataclass
+class RouteMatch:
+    endpoint_id: int
+    pattern: str
+
+
+class _Node:
+    __slots__ = ("children", "param", "wildcard", "methods", "pattern")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.param: Optional["_Node"] = None
+        self.wildcard: Optional["_Node"] = None
+        self.methods: Dict[str, int] = {}
+        self.pattern: Optional[str] = None
+
+    def is_empty(self) -> bool:
+        return not (self.children or self.param or self.wildcard or self.methods)
+
+
+class MethodNotAllowed(Exception):
+    def __init__(self, allowed: Sequence[str]):
+        super().__init__(", ".join(allowed))
+        self.allowed = sorted(allowed)
+
+
+class RouteTrie:
+    """
+    Префиксное дерево маршрутов одного пользователя.
+
+    Первый уровень - endpoint группы, дальше сегменты пути эндпоинта:
+    литералы, параметры вида {id} и завершающий "*", который забирает остаток пути.
+    При совпадении приоритет у литерала, затем у параметра, затем у "*".
+    Поиск не обращается к базе данных. Если на пути запроса литерал и параметр
+    не пересекаются, он стоит O(глубина пути). Иначе поиск откатывается из тупиковой
+    ветки литерала в ветку параметра. Каждый шаг спускается на уровень ниже, поэтому
+    каждый узел дерева посещается не больше одного раза. Худший случай ограничен числом
+    узлов пользователя на глубине запроса (до 2^глубина при пересечении на каждом уровне),
+    а не растет экспоненциально от числа маршрутов. Мемоизация здесь ничего не дает:
+    повторных посещений нет.
+    """
+
+    def __init__(self, permissions: Optional[dict] = None):
+        self._root = _Node()
+        self._routes: Dict[int, Tuple[str, str, str]] = {}
+        # role.permissions владельца (лимиты запросов и т.п.), загружаются вместе с маршрутами
+        self.permissions = permissions or {}
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def insert(self, group: str, path: str, method: str, endpoint_id: int) -> None:
+        if endpoint_id in self._routes:
+            self.remove(endpoint_id)
+
+        node = self._root.children.setdefault(group, _Node())
+        segments = split_path(path)
+        for index, segment in enumerate(segments):
+            if segment == WILDCARD and index == len(segments) - 1:
+                node.wildcard = node.wildcard or _Node()
+                node = node.wildcard
+            elif segment.startswith("{") and segment.endswith("}"):
+                # Параметры уровня с разными именами ({id}, {slug}) делят один узел
+                node.param = node.param or _Node()
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _Node())
+
+        node.methods[method.upper()] = endpoint_id
+        node.pattern = "/".join(segments)
+        self._routes[endpoint_id] = (group, path, method.upper())
+
+    def remove(self, endpoint_id: int) -> bool:
+        route = self._routes.pop(endpoint_id, None)
+        if route is None:
+            return False
+
+        group, path, method = route
+        trail = [(self._root, "children", group)]
+        node = self._root.children.get(group)
+        segments = split_path(path)
+        for index, segment in enumerate(segments):
+            if node is None:
+                return True
+            if segment == WILDCARD and index == len(segments) - 1:
+                trail.append((node, "wildcard", None))
+                node = node.wildcard
+            elif segment.startswith("{") and segment.endswith("}"):
+                trail.append((node, "param", None))
+                node = node.param
+            else:
+                trail.append((node, "children", segment))
+                node = node.children.get(segment)
+
+        if node is None or node.methods.get(method) != endpoint_id:
+            return True
+        del node.methods[method]
+
+        # Удаляем опустевшие узлы снизу вверх
+        for parent, attr, key in reversed(trail):
+            child = parent.children.get(key) if attr == "children" else getattr(parent, attr)
+            if child is None or not child.is_empty():
+                break
+            if attr == "children":
+                del parent.children[key]
+            else:
+                setattr(parent, attr, None)
+        return True
+
+    def match(self, group: str, segments: Sequence[str], method: str) -> Optional[RouteMatch]:
+        """
+        Поиск эндпоинта по сегментам пути запроса
+
+        Raises:
+            MethodNotAllowed: путь найден, но эндпоинта с таким методом нет
+        """
+        node = self._root.children.get(group)
+        if node is None:
+            return None
+
+        allowed: List[str] = []
+        found = self._match(node, segments, 0, method.upper(), allowed)
+        if found is None:
+            if allowed:
+                raise MethodNotAllowed(allowed)
+            return None
+
+        endpoint_id, pattern = found
+        return RouteMatch(endpoint_id, pattern)
+
+    def _match(self, node: _Node, segments: Sequence[str], index: int, method: str,
+               allowed: List[str]) -> Optional[Tuple[int, str]]:
+        if index == len(segments):
+            if method in node.methods:
+                return node.methods[method], node.pattern
+            allowed.extend(node.methods)
+            return None
+
+        segment = segments[index]
+        child = node.children.get(segment)
+        if child is not None:
+            found = self._match(child, segments, index + 1, method, allowed)
+            if found is not None:
+                return found
+
+        if node.param is not None:
+            found = self._match(node.param, segments, index + 1, method, allowed)
+            if found is not None:
+                return found
+
+        if node.wildcard is not None:
+            if method in node.wildcard.methods:
+                return node.wildcard.methods[method], node.wildcard.pattern
+            allowed.extend(node.wildcard.methods)
+
+        return None
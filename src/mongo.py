@@ -1,33 +1,80 @@
 import pymongo
-from pymongo import MongoClient
+from bson import ObjectId
+from gridfs import AsyncGridFSBucket
+from pymongo import AsyncMongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
-from typing import Optional, Dict, List, Any, Union
-from datetime import datetime
+from typing import Optional, Dict, List, Any, Union, AsyncIterator
+from datetime import datetime, timezone
 import logging
 
+from src.config import (MONGO_LINK, MONGO_BASE, MONGO_TIMEOUT_MS, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+                        MONGO_MAX_IDLE_TIME_MS, MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS,
+                        MOCK_GRIDFS_BUCKET)
+from src.metrics import timed
+from src.mocks.trie import normalize_path
 
-class MongoManager:
+# Ключ разрешения мока, денормализованный в документ эндпоинта:
+# позволяет ответить на /api одним индексным чтением из MongoDB без запроса в Postgres
+LOOKUP_INDEX_NAME = "lookup_key"
+LOOKUP_INDEX_KEYS = [("username", pymongo.ASCENDING), ("group", pymongo.ASCENDING),
+                     ("router", pymongo.ASCENDING), ("method", pymongo.ASCENDING)]
 
-    def __init__(self, connection_string: str, database_name: str):
+# Префикс служебных коллекций сервиса (статистика и т.п.) - в отличие от коллекций пользователей
+SERVICE_COLLECTION_PREFIX = "_mock."
+
+# Коллекция пользователя называется его username: имена с этими префиксами заняты
+# системными коллекциями MongoDB, GridFS и служебными коллекциями сервиса
+RESERVED_COLLECTION_PREFIXES = ("system.", f"{MOCK_GRIDFS_BUCKET}.", SERVICE_COLLECTION_PREFIX)
+
+
+def is_reserved_collection(collection_name: str) -> bool:
+    """Занято ли имя коллекции системой или сервисом (см. RESERVED_COLLECTION_PREFIXES)"""
+    return collection_name.startswith(RESERVED_COLLECTION_PREFIXES)
+
+
+class AsyncMongoManager:
+    """
+    Клиент MongoDB на AsyncMongoClient.
+
+    Методы не блокируют event loop, поэтому запросы к MongoDB
+    из разных обработчиков выполняются параллельно.
+    """
+
+    def __init__(self, connection_string: str, database_name: str,
+                 timeout_ms: int = 5000, max_pool_size: int = 100,
+                 min_pool_size: int = 0, max_idle_time_ms: Optional[int] = None,
+                 connect_timeout_ms: Optional[int] = None,
+                 socket_timeout_ms: Optional[int] = None,
+                 gridfs_bucket: str = "fs"):
         """
-        Инициализация подключения к MongoDB
+        Инициализация клиента MongoDB (подключение открывает connect)
 
         Args:
             connection_string: Строка подключения к MongoDB
             database_name: Имя базы данных
-            timeout_ms: Таймаут подключения в миллисекундах
+            timeout_ms: Таймаут выбора сервера в миллисекундах
             max_pool_size: Максимальный размер пула соединений
+            min_pool_size: Минимальный размер пула соединений
+            max_idle_time_ms: Время простоя соединения в пуле до закрытия
+            connect_timeout_ms: Таймаут установки соединения
+            socket_timeout_ms: Таймаут операций на сокете
+            gridfs_bucket: Имя бакета GridFS для больших тел
         """
         self.connection_string = connection_string
         self.database_name = database_name
-        self.client: Optional[MongoClient] = None
+        self.client: Optional[AsyncMongoClient] = None
         self.db = None
-        self.timeout_ms = 5000
-        self.max_pool_size = 100
+        self.timeout_ms = timeout_ms
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.max_idle_time_ms = max_idle_time_ms
+        self.connect_timeout_ms = connect_timeout_ms
+        self.socket_timeout_ms = socket_timeout_ms
+        self.gridfs_bucket = gridfs_bucket
+        self._gridfs: Optional[AsyncGridFSBucket] = None
         self.logger = logging.getLogger(__name__)
 
-
-    def connect(self) -> bool:
+    async def connect(self) -> bool:
         """
         Установка соединения с MongoDB
 
@@ -35,14 +82,17 @@ class MongoManager:
             bool: True если соединение успешно установлено
         """
         try:
-            self.client = MongoClient(
+            self.client = AsyncMongoClient(
                 self.connection_string,
                 serverSelectionTimeoutMS=self.timeout_ms,
-                maxPoolSize=self.max_pool_size
+                maxPoolSize=self.max_pool_size,
+                minPoolSize=self.min_pool_size,
+                maxIdleTimeMS=self.max_idle_time_ms,
+                connectTimeoutMS=self.connect_timeout_ms,
+                socketTimeoutMS=self.socket_timeout_ms
             )
-            # Проверка соединения
-            self.client.admin.command('ping')
             self.db = self.client[self.database_name]
+            await self.client.admin.command('ping')
             self.logger.info(f"Успешно подключено к MongoDB: {self.database_name}")
             return True
 
@@ -50,24 +100,27 @@ class MongoManager:
             self.logger.error(f"Ошибка подключения к MongoDB: {e}")
             return False
 
-    def disconnect(self):
+    async def disconnect(self):
         """Закрытие соединения с MongoDB"""
         if self.client:
-            self.client.close()
+            await self.client.close()
+            self.client = None
+            self.db = None
+            self._gridfs = None
             self.logger.info("Соединение с MongoDB закрыто")
 
-    def __enter__(self):
+    async def __aenter__(self):
         """Контекстный менеджер для подключения"""
-        self.connect()
+        await self.connect()
         return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Автоматическое закрытие соединения"""
-        self.disconnect()
+        await self.disconnect()
 
-    def create_collection_if_not_exists(self, collection_name: str) -> bool:
+    async def create_collection_if_not_exists(self, collection_name: str) -> bool:
         """
-        Создание коллекции, если она не существует
+        Создание коллекции, если она не существует (вместе с индексами)
 
         Args:
             collection_name: Имя коллекции
@@ -76,11 +129,12 @@ class MongoManager:
             bool: True если коллекция создана или уже существует
         """
         try:
-            if collection_name in self.db.list_collection_names():
+            if collection_name in await self.db.list_collection_names():
                 self.logger.info(f"Коллекция {collection_name} уже существует")
                 return True
 
-            self.db.create_collection(collection_name)
+            await self.db.create_collection(collection_name)
+            await self.ensure_indexes(collection_name)
             self.logger.info(f"Коллекция {collection_name} создана")
             return True
 
@@ -88,8 +142,74 @@ class MongoManager:
             self.logger.error(f"Ошибка при создании коллекции {collection_name}: {e}")
             return False
 
+    async def ensure_indexes(self, collection_name: str) -> bool:
+        """
+        Создание индексов коллекции пользователя (операция идемпотентна)
+
+        Args:
+            collection_name: Имя коллекции
+
+        Returns:
+            bool: True если индексы созданы или уже существуют
+        """
+        try:
+            await self.db[collection_name].create_index("endpoint_id", name="endpoint_id")
+            # Частичный индекс: старые документы без ключа разрешения не мешают уникальности
+            await self.db[collection_name].create_index(
+                LOOKUP_INDEX_KEYS,
+                name=LOOKUP_INDEX_NAME,
+                unique=True,
+                partialFilterExpression={"username": {"$exists": True}}
+            )
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при создании индексов коллекции {collection_name}: {e}")
+            return False
+
+    async def list_user_collections(self) -> List[str]:
+        """
+        Коллекции пользователей (без системных, GridFS и служебных _mock.*)
+
+        Returns:
+            List[str]: Имена коллекций (пустой список при ошибке)
+        """
+        try:
+            collection_names = await self.db.list_collection_names()
+        except Exception as e:
+            self.logger.error(f"Ошибка при получении списка коллекций: {e}")
+            return []
+
+        return [collection_name for collection_name in collection_names
+                if not is_reserved_collection(collection_name)
+                and not collection_name.startswith(f"{self.gridfs_bucket}.")]
 
-    def drop_collection(self, collection_name: str, confirm: bool = False) -> bool:
+    async def ensure_all_indexes(self) -> None:
+        """Создание индексов во всех коллекциях пользователей (вызывается при старте)"""
+        for collection_name in await self.list_user_collections():
+            await self.ensure_indexes(collection_name)
+
+    async def create_index(self, collection_name: str, keys: Union[str, List[tuple]], **options) -> bool:
+        """
+        Создание индекса служебной коллекции (операция идемпотентна)
+
+        Args:
+            collection_name: Имя коллекции
+            keys: Поле или список (поле, направление)
+            options: Параметры индекса (name, unique, expireAfterSeconds, ...)
+
+        Returns:
+            bool: True если индекс создан или уже существует
+        """
+        try:
+            await self.db[collection_name].create_index(keys, **options)
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при создании индекса коллекции {collection_name}: {e}")
+            return False
+
+    async def drop_collection(self, collection_name: str, confirm: bool = False) -> bool:
         """
         Удаление коллекции
 
@@ -107,12 +227,12 @@ class MongoManager:
 
         try:
             # Проверяем существование коллекции
-            if collection_name not in self.db.list_collection_names():
+            if collection_name not in await self.db.list_collection_names():
                 self.logger.warning(f"Коллекция {collection_name} не существует")
                 return False
 
             # Удаляем коллекцию
-            self.db[collection_name].drop()
+            await self.db[collection_name].drop()
             self.logger.info(f"Коллекция {collection_name} успешно удалена")
             return True
 
@@ -120,8 +240,8 @@ class MongoManager:
             self.logger.error(f"Ошибка при удалении коллекции {collection_name}: {e}")
             return False
 
-
-    def insert_one(self, collection: str, document: Dict[str, Any]) -> Optional[str]:
+    @timed("mongo")
+    async def insert_one(self, collection: str, document: Dict[str, Any]) -> Optional[str]:
         """
         Вставка одного документа
 
@@ -134,10 +254,11 @@ class MongoManager:
         """
         try:
             # Добавляем временные метки
-            document['created_at'] = datetime.now()
-            document['updated_at'] = datetime.now()
+            now = datetime.now(timezone.utc)
+            document['created_at'] = now
+            document['updated_at'] = now
 
-            result = self.db[collection].insert_one(document)
+            result = await self.db[collection].insert_one(document)
             self.logger.info(f"Документ вставлен в {collection} с ID: {result.inserted_id}")
             return str(result.inserted_id)
 
@@ -145,10 +266,51 @@ class MongoManager:
             self.logger.error(f"Ошибка при вставке документа: {e}")
             return None
 
-    def find_one(self, collection: str, endpoint_id: int) -> Optional[Dict[str, Any]]:
+    @timed("mongo")
+    async def insert_many(self, collection: str, documents: List[Dict[str, Any]]) -> List[str]:
+        """
+        Вставка нескольких документов одним запросом
+
+        Args:
+            collection: Имя коллекции
+            documents: Документы для вставки
+
+        Returns:
+            List[str]: ID вставленных документов (пустой список при ошибке)
+        """
+        if not documents:
+            return []
+        try:
+            now = datetime.now(timezone.utc)
+            for document in documents:
+                document['created_at'] = now
+                document['updated_at'] = now
+
+            result = await self.db[collection].insert_many(documents, ordered=False)
+            self.logger.info(f"В {collection} вставлено документов: {len(result.inserted_ids)}")
+            return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при вставке документов: {e}")
+            return []
+
+    @timed("mongo")
+    async def find_one(self, collection: str, endpoint_id: int,
+                       projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Поиск документа эндпоинта
+
+        Args:
+            collection: Имя коллекции
+            endpoint_id: ID эндпоинта
+            projection: Поля документа, которые нужно вернуть
+
+        Returns:
+            Optional[Dict[str, Any]]: Найденный документ или None
+        """
         try:
             query = {"endpoint_id": endpoint_id}
-            result = self.db[collection].find_one(query)
+            result = await self.db[collection].find_one(query, projection)
 
             if result and '_id' in result:
                 result['_id'] = str(result['_id'])
@@ -164,8 +326,108 @@ class MongoManager:
             self.logger.error(f"Ошибка при поиске эндпоинта '{endpoint_id}': {e}")
             return None
 
-    def update_one(self, collection: str, query: Dict[str, Any],
-                   update: Dict[str, Any], upsert: bool = False) -> bool:
+    @timed("mongo")
+    async def find_many(self, collection: str, endpoint_ids: List[int],
+                        projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Поиск документов нескольких эндпоинтов одним запросом
+
+        Args:
+            collection: Имя коллекции
+            endpoint_ids: ID эндпоинтов
+            projection: Поля документа, которые нужно вернуть
+
+        Returns:
+            List[Dict[str, Any]]: Найденные документы (порядок не гарантирован)
+        """
+        if not endpoint_ids:
+            return []
+        try:
+            cursor = self.db[collection].find({"endpoint_id": {"$in": list(endpoint_ids)}}, projection)
+            return await cursor.to_list()
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при поиске эндпоинтов в коллекции {collection}: {e}")
+            return []
+
+    @timed("mongo")
+    async def find(self, collection: str, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None,
+                   sort: Optional[List[tuple]] = None, limit: int = 0) -> List[Dict[str, Any]]:
+        """
+        Поиск документов по произвольному запросу
+
+        Args:
+            collection: Имя коллекции
+            query: Условие поиска
+            projection: Поля документа, которые нужно вернуть
+            sort: Список (поле, направление)
+            limit: Максимум документов (0 - без ограничения)
+
+        Returns:
+            List[Dict[str, Any]]: Найденные документы
+        """
+        try:
+            cursor = self.db[collection].find(query, projection, sort=sort, limit=limit)
+            return await cursor.to_list()
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при поиске в коллекции {collection}: {e}")
+            return []
+
+    @timed("mongo")
+    async def find_by_lookup(self, collection: str, username: str, group: str, path: str, method: str,
+                             projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Поиск документа эндпоинта по денормализованному ключу разрешения
+
+        Args:
+            collection: Имя коллекции
+            username: Имя пользователя
+            group: Endpoint группы
+            path: Путь эндпоинта
+            method: HTTP-метод
+            projection: Поля документа, которые нужно вернуть
+
+        Returns:
+            Optional[Dict[str, Any]]: Найденный документ или None
+        """
+        try:
+            query = {"username": username, "group": group, "router": normalize_path(path), "method": method.upper()}
+            return await self.db[collection].find_one(query, {"_id": 0, **(projection or {})})
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при поиске эндпоинта '{group}/{path}': {e}")
+            return None
+
+    @timed("mongo")
+    async def aggregate_one(self, collection: str, pipeline: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Первый документ результата агрегации
+
+        Args:
+            collection: Имя коллекции
+            pipeline: Стадии агрегации
+
+        Returns:
+            Optional[Dict[str, Any]]: Документ или None, если результат пуст
+
+        Raises:
+            PyMongoError: Ошибка агрегации не превращается в пустой результат,
+                чтобы вызывающий код не принял ее за отсутствие документа
+        """
+        try:
+            cursor = await self.db[collection].aggregate(pipeline)
+            async for document in cursor:
+                return document
+            return None
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при агрегации в {collection}: {e}")
+            raise
+
+    @timed("mongo")
+    async def update_one(self, collection: str, query: Dict[str, Any],
+                         update: Dict[str, Any], upsert: bool = False) -> bool:
         """
         Обновление одного документа
 
@@ -181,11 +443,11 @@ class MongoManager:
         try:
             # Добавляем время обновления
             if '$set' in update:
-                update['$set']['updated_at'] = datetime.now()
+                update['$set']['updated_at'] = datetime.now(timezone.utc)
             else:
-                update['$set'] = {'updated_at': datetime.now()}
+                update['$set'] = {'updated_at': datetime.now(timezone.utc)}
 
-            result = self.db[collection].update_one(query, update, upsert=upsert)
+            result = await self.db[collection].update_one(query, update, upsert=upsert)
 
             if result.matched_count > 0:
                 self.logger.info(f"Обновлен документ в {collection}")
@@ -201,7 +463,30 @@ class MongoManager:
             self.logger.error(f"Ошибка при обновлении документа: {e}")
             return False
 
-    def delete_one(self, collection: str, query: Dict[str, Any]) -> bool:
+    @timed("mongo")
+    async def bulk_write(self, collection: str, operations: List[Any]) -> bool:
+        """
+        Пакетная запись (UpdateOne, InsertOne, ...) одним запросом
+
+        Args:
+            collection: Имя коллекции
+            operations: Операции pymongo
+
+        Returns:
+            bool: True если все операции выполнены
+        """
+        if not operations:
+            return True
+        try:
+            await self.db[collection].bulk_write(operations, ordered=False)
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при пакетной записи в {collection}: {e}")
+            return False
+
+    @timed("mongo")
+    async def delete_one(self, collection: str, query: Dict[str, Any]) -> bool:
         """
         Удаление одного документа
 
@@ -213,7 +498,7 @@ class MongoManager:
             bool: True если удаление успешно
         """
         try:
-            result = self.db[collection].delete_one(query)
+            result = await self.db[collection].delete_one(query)
             if result.deleted_count > 0:
                 self.logger.info(f"Удален документ из {collection}")
                 return True
@@ -224,3 +509,124 @@ class MongoManager:
         except Exception as e:
             self.logger.error(f"Ошибка при удалении документа: {e}")
             return False
+
+    @timed("mongo")
+    async def delete_many(self, collection: str, query: Dict[str, Any]) -> int:
+        """
+        Удаление всех документов по условию
+
+        Args:
+            collection: Имя коллекции
+            query: Условие удаления
+
+        Returns:
+            int: Количество удаленных документов
+        """
+        try:
+            result = await self.db[collection].delete_many(query)
+            self.logger.info(f"Из {collection} удалено документов: {result.deleted_count}")
+            return result.deleted_count
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при удалении документов из {collection}: {e}")
+            return 0
+
+    @property
+    def gridfs(self) -> AsyncGridFSBucket:
+        """Бакет GridFS текущей базы (создается при первом обращении)"""
+        if self._gridfs is None:
+            self._gridfs = AsyncGridFSBucket(self.db, bucket_name=self.gridfs_bucket)
+        return self._gridfs
+
+    @timed("mongo")
+    async def upload_file(self, filename: str, data: bytes,
+                          metadata: Optional[Dict[str, Any]] = None) -> Optional[ObjectId]:
+        """
+        Сохранение файла в GridFS
+
+        Args:
+            filename: Имя файла
+            data: Содержимое
+            metadata: Дополнительные поля файла
+
+        Returns:
+            Optional[ObjectId]: ID файла или None
+        """
+        try:
+            return await self.gridfs.upload_from_stream(filename, data, metadata=metadata)
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при сохранении файла {filename} в GridFS: {e}")
+            return None
+
+    @timed("mongo")
+    async def open_file(self, file_id: ObjectId) -> Optional[AsyncIterator[bytes]]:
+        """
+        Открытие файла GridFS для чтения по чанкам, без загрузки в память целиком
+
+        Returns:
+            Optional[AsyncIterator[bytes]]: Итератор по чанкам файла или None, если файла нет
+        """
+        try:
+            return await self.gridfs.open_download_stream(file_id)
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при открытии файла {file_id} из GridFS: {e}")
+            return None
+
+    @timed("mongo")
+    async def download_file(self, file_id: ObjectId) -> Optional[bytes]:
+        """
+        Чтение файла GridFS целиком
+
+        Args:
+            file_id: ID файла
+
+        Returns:
+            Optional[bytes]: Содержимое файла или None
+        """
+        try:
+            grid_out = await self.gridfs.open_download_stream(file_id)
+            return await grid_out.read()
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при чтении файла {file_id} из GridFS: {e}")
+            return None
+
+    @timed("mongo")
+    async def delete_file(self, file_id: ObjectId) -> bool:
+        """
+        Удаление файла из GridFS
+
+        Args:
+            file_id: ID файла
+
+        Returns:
+            bool: True если файл удален
+        """
+        try:
+            await self.gridfs.delete(file_id)
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при удалении файла {file_id} из GridFS: {e}")
+            return False
+
+
+# Один клиент на процесс (воркер gunicorn): подключение открывается в lifespan приложения,
+# а обработчики получают его через зависимость get_mongo
+mongo_manager = AsyncMongoManager(
+    MONGO_LINK,
+    MONGO_BASE,
+    timeout_ms=MONGO_TIMEOUT_MS,
+    max_pool_size=MONGO_MAX_POOL_SIZE,
+    min_pool_size=MONGO_MIN_POOL_SIZE,
+    max_idle_time_ms=MONGO_MAX_IDLE_TIME_MS,
+    connect_timeout_ms=MONGO_CONNECT_TIMEOUT_MS,
+    socket_timeout_ms=MONGO_SOCKET_TIMEOUT_MS,
+    gridfs_bucket=MOCK_GRIDFS_BUCKET,
+)
+
+
+def get_mongo() -> AsyncMongoManager:
+    return mongo_manager
@@ -0,0 +1,56 @@
+import asyncio
+from collections import defaultdict
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from sqlalchemy import select
+
+from src.auth.models import user
+from src.database import get_async_session
+from src.endpoints.models import endpoint
+from src.groups.models import group
+from src.mocks.trie import normalize_path
+from src.mongo import mongo_manager
+
+# Заполняет ключ разрешения (username, group, router, method) в документах эндпоинтов,
+# созданных до появления режима MOCK_RESOLVE_MODE=mongo, и создает уникальный индекс по нему.
+# Повторный запуск нормализует router в документах, записанных с "/" по краям или "//" в пути
+
+
+async def main():
+    await mongo_manager.connect()
+    try:
+        async for session in get_async_session():
+            query = select(
+                user.c.username, group.c.endpoint.label("group"),
+                endpoint.c.id, endpoint.c.path, endpoint.c.method
+            ).select_from(
+                user.join(group, group.c.user_id == user.c.id).join(endpoint, endpoint.c.group_id == group.c.id)
+            )
+            result = await session.execute(query)
+
+            operations = defaultdict(list)
+            for row in result:
+                operations[row.username].append(UpdateOne(
+                    {"endpoint_id": row.id},
+                    {"$set": {
+                        "username": row.username,
+                        "group": row.group,
+                        "router": normalize_path(row.path),
+                        "method": row.method.upper(),
+                    }}
+                ))
+
+            for username, user_operations in operations.items():
+                try:
+                    result = await mongo_manager.db[username].bulk_write(user_operations, ordered=False)
+                    print(f"{username}: обновлено документов {result.modified_count} из {len(user_operations)}")
+                except BulkWriteError as e:
+                    print(f"{username}: ошибки при обновлении документов: {e.details['writeErrors']}")
+                await mongo_manager.ensure_indexes(username)
+    finally:
+        await mongo_manager.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from src.mocks.payloads import PAYLOADS_COLLECTION, STORAGE_CODEC, stored_fields, store_payloads
+from src.mongo import mongo_manager
+
+# Переводит существующие документы на текущую схему хранения тел:
+# 1) тела, записанные прямо в документ эндпоинта, переносятся в общее хранилище _mock.payloads;
+# 2) общие тела от MOCK_STORAGE_MIN_SIZE сжимаются кодеком MOCK_STORAGE_CODEC.
+# Запускается с теми же MOCK_STORAGE_CODEC и MOCK_STORAGE_MIN_SIZE, что и сервис:
+# python -m src.script_compress_payloads [--batch 500]
+
+# Поля тела в документе эндпоинта, которые заменяет ссылка payload
+INLINE_FIELDS = {"data": "", "body": "", "encodings": "", "etag": "", "blob": "", "codec": ""}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Перенос и сжатие тел моков в MongoDB")
+    parser.add_argument("--batch", type=int, default=500, help="Документов за один bulk_write")
+    return parser.parse_args()
+
+
+async def move_inline_payloads(collection: str, batch_size: int) -> int:
+    """Перенос тел из документов эндпоинтов коллекции в общее хранилище"""
+    cursor = mongo_manager.db[collection].find(
+        {"payload": {"$exists": False}, "gridfs_id": {"$exists": False}, "data": {"$exists": True}},
+        {"endpoint_id": 1, "username": 1, "data": 1}
+    )
+    moved = 0
+    batch = []
+    async for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            moved += await _move_batch(collection, batch)
+            batch = []
+    if batch:
+        moved += await _move_batch(collection, batch)
+    return moved
+
+
+async def _move_batch(collection: str, documents) -> int:
+    ids = [document.pop("_id") for document in documents]
+    documents = await store_payloads(mongo_manager, documents)
+    operations = [
+        UpdateOne({"_id": document_id}, {"$set": {"payload": document["payload"]}, "$unset": INLINE_FIELDS})
+        for document_id, document in zip(ids, documents) if "payload" in document
+    ]
+    if not await mongo_manager.bulk_write(collection, operations):
+        # Ссылки уже засчитаны в refs: при повторном запуске тела не удалятся раньше времени, а лишь задержатся
+        print(f"{collection}: не удалось обновить документы, ссылки на тела засчитаны без документов")
+        return 0
+    return len(operations)
+
+
+async def compress_shared_payloads(batch_size: int) -> int:
+    """Сжатие общих тел, которые хранятся несжатыми"""
+    cursor = mongo_manager.db[PAYLOADS_COLLECTION].find({"body": {"$exists": True}}, {"data": 1, "body": 1})
+    compressed = 0
+    operations = []
+    async for document in cursor:
+        fields = stored_fields(document.get("data"), bytes(document["body"]))
+        if "blob" not in fields:
+            continue
+        operations.append(UpdateOne({"_id": document["_id"]}, {"$set": fields, "$unset": {"data": "", "body": ""}}))
+        if len(operations) >= batch_size:
+            compressed += len(operations) if await mongo_manager.bulk_write(PAYLOADS_COLLECTION, operations) else 0
+            operations = []
+    if operations:
+        compressed += len(operations) if await mongo_manager.bulk_write(PAYLOADS_COLLECTION, operations) else 0
+    return compressed
+
+
+async def main():
+    args = parse_args()
+
+    if not await mongo_manager.connect():
+        print("Не удалось подключиться к MongoDB")
+        return
+    try:
+        for collection in await mongo_manager.list_user_collections():
+            moved = await move_inline_payloads(collection, args.batch)
+            if moved:
+                print(f"{collection}: тел перенесено в {PAYLOADS_COLLECTION}: {moved}")
+
+        if STORAGE_CODEC is None:
+            print("MOCK_STORAGE_CODEC не задан: общие тела не сжимаются")
+            return
+        print(f"Сжато тел ({STORAGE_CODEC}): {await compress_shared_payloads(args.batch)}")
+    finally:
+        await mongo_manager.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from src.auth.models import User
+from src.database import get_async_session
+from src.endpoints.importers import detect_format, import_endpoints, iter_har, iter_openapi
+from src.mongo import mongo_manager
+
+# Импорт эндпоинтов из OpenAPI 3 (JSON) или HAR в группу пользователя:
+# python -m src.script_import --username user --group petstore openapi.json
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Импорт моков из OpenAPI или HAR")
+    parser.add_argument("file")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--group", required=True, help="endpoint группы; создается, если ее нет")
+    parser.add_argument("--group-name", help="Название создаваемой группы")
+    parser.add_argument("--source", choices=["openapi", "har"], help="По умолчанию по расширению файла")
+    parser.add_argument("--base-path", default="", help="Префикс URL, отрезаемый от путей HAR")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    source = args.source or detect_format(args.file)
+
+    await mongo_manager.connect()
+    try:
+        async for session in get_async_session():
+            user = (await session.execute(select(User).where(User.username == args.username))).scalar()
+            if user is None:
+                print(f"Пользователь {args.username} не найден")
+                return
+
+            with open(args.file, "rb") as f:
+                endpoints = iter_openapi(f) if source == "openapi" else iter_har(f, args.base_path)
+                summary = await import_endpoints(session, mongo_manager, user, endpoints, args.group,
+                                                 args.group_name)
+
+            print(f"Создано эндпоинтов: {summary['created']}, пропущено: {summary['skipped']}")
+            for error in summary["errors"]:
+                print(f"{error['method']} {error['path']}: {error['detail']}")
+    finally:
+        await mongo_manager.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import os
+from itertools import groupby
+
+from sqlalchemy import select
+
+from src.auth.models import user
+from src.database import get_async_session
+from src.endpoints.models import endpoint
+from src.groups.models import group
+from src.mocks.payloads import load_payloads
+from src.mocks.snapshot import SnapshotWriter
+from src.mongo import mongo_manager
+
+# Выгрузка всех моков (группы, эндпоинты и тела) в файл снимка для MOCK_SNAPSHOT_PATH:
+# python -m src.script_snapshot mocks.snap [--username user]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Экспорт моков в файл снимка")
+    parser.add_argument("file")
+    parser.add_argument("--username", action="append", help="Выгрузить только этих пользователей")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+
+    if not await mongo_manager.connect():
+        print("Не удалось подключиться к MongoDB")
+        return
+    try:
+        async for session in get_async_session():
+            query = select(
+                user.c.username, group.c.endpoint.label("group"),
+                endpoint.c.id, endpoint.c.path, endpoint.c.method
+            ).select_from(
+                user.join(group, group.c.user_id == user.c.id).join(endpoint, endpoint.c.group_id == group.c.id)
+            ).order_by(user.c.username, endpoint.c.id)
+            if args.username:
+                query = query.where(user.c.username.in_(args.username))
+            result = await session.execute(query)
+
+            # Снимок пишется во временный файл и подменяется атомарно: воркеры не увидят его недописанным
+            tmp_path = f"{args.file}.tmp"
+            with open(tmp_path, "wb") as f:
+                writer = SnapshotWriter(f)
+                for username, rows in groupby(result, key=lambda row: row.username):
+                    rows = list(rows)
+                    documents = await mongo_manager.find_many(username, [row.id for row in rows])
+                    # Общие тела читаются одним запросом на пользователя
+                    payloads = await load_payloads(mongo_manager, username, documents)
+
+                    for row in rows:
+                        payload = payloads.get(row.id)
+                        if payload is None:
+                            print(f"{username}: нет документа эндпоинта {row.id}, пропущен")
+                            continue
+
+                        if payload.streamed:
+                            body = await mongo_manager.download_file(payload.gridfs_id)
+                            encodings = {}
+                            for encoding, (file_id, _) in payload.encodings.items():
+                                variant = await mongo_manager.download_file(file_id)
+                                if variant is not None:
+                                    encodings[encoding] = variant
+                            if body is None:
+                                print(f"{username}: тело эндпоинта {row.id} не найдено в GridFS, пропущен")
+                                continue
+                        else:
+                            body, encodings = payload.body, payload.encodings
+
+                        writer.add(username, row.group, row.path, row.method, row.id,
+                                   body, payload.etag, payload.last_modified, encodings)
+                writer.finish()
+            os.replace(tmp_path, args.file)
+            print(f"Снимок {args.file}: эндпоинтов {len(writer)}")
+    finally:
+        await mongo_manager.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,9 @@
+import os
+
+# src.config читает подключения из окружения при импорте. Модульные тесты к базам
+# не подключаются, поэтому хватает заглушек; заданные значения не перезаписываются
+for name, value in {
+    "DB_HOST": "localhost", "DB_PORT": "5432", "DB_NAME": "test", "DB_USER": "test", "DB_PASS": "test",
+    "MONGO_HOST": "localhost", "MONGO_PORT": "27017", "MONGO_BASE": "test", "SECRET_AUTH": "test",
+}.items():
+    os.environ.setdefault(name, value)
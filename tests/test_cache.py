@@ -0,0 +1,100 @@
+import pytest
+
+import src.cache
+from src.cache import TTLCache
+from src.mocks.cache import CachedRoute, RouteCache
+from src.mocks.payloads import StoredPayload
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(src.cache.time, "monotonic", clock)
+    return clock
+
+
+def test_lru_eviction():
+    cache = TTLCache(2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration(clock):
+    cache = TTLCache(10, 5)
+    cache.set("a", 1)
+    clock.now += 4
+    assert cache.get("a") == 1
+
+    clock.now += 2
+    assert "a" not in cache
+    assert cache.get("a", "missing") == "missing"
+    stats = cache.stats()
+    assert stats["expirations"] == 1 and stats["size"] == 0
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_zero_size_disables_cache():
+    cache = TTLCache(0, 60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def route(endpoint_id):
+    return CachedRoute(endpoint_id, StoredPayload())
+
+
+def make_route_cache():
+    cache = RouteCache(100, 60)
+    cache.set(("u", "g", "a", "GET"), route(1))
+    cache.set(("u", "g", "b/1", "GET"), route(2))
+    cache.set(("u", "g", "b/2", "GET"), route(2))
+    cache.set(("u", "h", "a", "GET"), route(3))
+    cache.set(("v", "g", "a", "GET"), route(4))
+    return cache
+
+
+def test_invalidate_endpoint_drops_all_its_keys():
+    cache = make_route_cache()
+    cache.invalidate_endpoint(2)
+    assert ("u", "g", "b/1", "GET") not in cache
+    assert ("u", "g", "b/2", "GET") not in cache
+    assert ("u", "g", "a", "GET") in cache
+    assert 2 not in cache._by_endpoint
+
+
+def test_invalidate_route_group_and_user():
+    cache = make_route_cache()
+    cache.invalidate_route("u", "g", "a", "get")
+    assert ("u", "g", "a", "GET") not in cache
+
+    cache.invalidate_group("u", "g")
+    assert len(cache) == 2
+    assert ("u", "g") not in cache._by_group
+
+    cache.invalidate_user("u")
+    assert list(cache._data) == [("v", "g", "a", "GET")]
+
+
+def test_indexes_follow_eviction_and_overwrite():
+    cache = RouteCache(1, 60)
+    cache.set(("u", "g", "a", "GET"), route(1))
+    cache.set(("u", "g", "a", "GET"), route(2))
+    assert 1 not in cache._by_endpoint
+
+    cache.set(("u", "h", "a", "GET"), route(3))
+    assert cache._by_group == {("u", "h"): {("u", "h", "a", "GET")}}
+    assert cache._by_endpoint == {3: {("u", "h", "a", "GET")}}
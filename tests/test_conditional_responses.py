@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+import pytest
+from starlette.requests import Request
+
+from src.mocks.payloads import StoredPayload, make_etag
+from src.mocks.router import _choose_encoding, _not_modified
+
+
+def request(**headers):
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                    "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]})
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("identity", None),
+    ("gzip;q=bad, br", "br"),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert _choose_encoding(accept_encoding, {"br": b"", "gzip": b""}) == expected
+
+
+def test_choose_encoding_only_available():
+    assert _choose_encoding("br, gzip;q=0.1", {"gzip": b""}) == "gzip"
+    assert _choose_encoding("gzip", {}) is None
+
+
+def test_variant_etag_per_encoding():
+    payload = StoredPayload(body=b"[1]", etag=make_etag(b"[1]"), encodings={"gzip": b"zz"})
+    assert payload.variant(None) == (b"[1]", 3, payload.etag)
+    body, size, etag = payload.variant("gzip")
+    assert (body, size) == (b"zz", 2)
+    assert etag == payload.etag[:-1] + '-gzip"'
+
+
+def test_not_modified_by_etag():
+    etag = make_etag(b"1")
+    assert _not_modified(request(if_none_match=etag), etag, None)
+    assert _not_modified(request(if_none_match=f'"other", W/{etag}'), etag, None)
+    assert _not_modified(request(if_none_match="*"), etag, None)
+    assert not _not_modified(request(if_none_match='"other"'), etag, None)
+    assert not _not_modified(request(if_none_match=etag), None, None)
+
+
+def test_not_modified_by_date():
+    modified = datetime(2024, 1, 2, 3, 4, 5, 600000, tzinfo=timezone.utc)
+    assert _not_modified(request(if_modified_since="Tue, 02 Jan 2024 03:04:05 GMT"), None, modified)
+    assert not _not_modified(request(if_modified_since="Tue, 02 Jan 2024 03:04:04 GMT"), None, modified)
+    assert not _not_modified(request(if_modified_since="not a date"), None, modified)
+    # If-None-Match важнее If-Modified-Since
+    assert not _not_modified(request(if_none_match='"x"', if_modified_since="Tue, 02 Jan 2024 03:04:05 GMT"),
+                             '"y"', modified)
+    assert not _not_modified(request(), '"y"', modified)
@@ -0,0 +1,46 @@
+import pytest
+
+from src.endpoints.utils import parse_json_data
+
+
+def test_parse_json_data():
+    assert parse_json_data('{"a": [1, 2.5, null]}') == {"a": [1, 2.5, None]}
+
+
+@pytest.mark.parametrize("json_data", ["{bad", "NaN", "[1, -Infinity]", ""])
+def test_parse_json_data_rejects_what_cannot_be_served(json_data):
+    with pytest.raises(ValueError):
+        parse_json_data(json_data)
+
+
+@pytest.fixture
+def client():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from src.auth.base_config import current_user
+    from src.database import get_async_session
+    from src.endpoints.router import router
+    from src.mongo import get_mongo
+
+    app = FastAPI()
+    app.include_router(router)
+    # Ошибки разбора возвращаются до обращения к базам
+    for dependency in (current_user, get_async_session, get_mongo):
+        app.dependency_overrides[dependency] = lambda: None
+    return TestClient(app)
+
+
+def test_bulk_ndjson_reports_malformed_line(client):
+    body = (b'{"group_name": "g", "path": "a", "method": "GET", "json_data": "{}"}\n'
+            b'\n'
+            b'{"group_name": "g", "path": \n')
+    response = client.post("/endpoint/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 422
+    assert [error["loc"][:2] for error in response.json()["detail"]] == [["body", 3]]
+
+
+def test_bulk_json_array_error_is_serializable(client):
+    response = client.post("/endpoint/bulk", content=b'[{"group_name": "g"', headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+    assert all("input" not in error for error in response.json()["detail"])
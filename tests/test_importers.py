@@ -0,0 +1,29 @@
+import io
+import json
+
+from src.endpoints.importers import iter_har
+
+
+def har(*entries):
+    return io.BytesIO(json.dumps({"log": {"entries": list(entries)}}).encode())
+
+
+def entry(url, status=200, text="{}", method="GET", **content):
+    return {"request": {"method": method, "url": url},
+            "response": {"status": status, "content": {"mimeType": "application/json", "text": text, **content}}}
+
+
+def test_har_reports_broken_entries_and_keeps_going():
+    endpoints = list(iter_har(har(
+        entry("http://x/api/a", status="OK"),
+        entry("http://x/api/b", text="%%%", encoding="base64"),
+        entry("http://x/api/c", status=404),
+        entry("http://x/api/a", text='{"a": 1}'),
+    ), "api"))
+
+    assert [(item.path, item.error) for item in endpoints] == [
+        ("a", "log.entries[0]: некорректный status"),
+        ("b", "log.entries[1]: содержимое не JSON"),
+        ("a", None),
+    ]
+    assert endpoints[-1].data == {"a": 1}
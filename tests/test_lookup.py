@@ -0,0 +1,26 @@
+import asyncio
+
+from src.endpoints.utils import endpoint_document
+from src.mongo import AsyncMongoManager
+
+
+class Collection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def find_one(self, query, projection=None):
+        for document in self.documents:
+            if all(document.get(key) == value for key, value in query.items()):
+                return document
+        return None
+
+
+def test_lookup_key_is_normalized_on_write_and_read():
+    document = endpoint_document("u", "g", 1, "/users//me/", "get", [1])
+    assert (document["router"], document["method"]) == ("users/me", "GET")
+
+    mongo = AsyncMongoManager("mongodb://unused", "test")
+    mongo.db = {"u": Collection([document])}
+    for path in ("users/me", "/users/me", "users//me/"):
+        found = asyncio.run(mongo.find_by_lookup("u", "u", "g", path, "GET"))
+        assert found is not None and found["endpoint_id"] == 1
@@ -0,0 +1,51 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine, inspect
+
+MIGRATIONS = Path(__file__).resolve().parent.parent / "migrations" / "versions"
+
+
+def load_migration(name: str):
+    spec = importlib.util.spec_from_file_location(name, MIGRATIONS / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE "group" (id INTEGER PRIMARY KEY, user_id INTEGER, endpoint TEXT)')
+        conn.exec_driver_sql("CREATE TABLE endpoint (id INTEGER PRIMARY KEY, group_id INTEGER, path TEXT, method TEXT)")
+        yield conn
+
+
+def upgrade(conn, migration):
+    with Operations.context(MigrationContext.configure(conn)):
+        migration.upgrade()
+
+
+def test_lookup_indexes_stop_on_duplicates(connection):
+    migration = load_migration("2ad5a97b95fb_add_lookup_indexes")
+    connection.exec_driver_sql("INSERT INTO \"group\" VALUES (1, 1, 'g'), (2, 1, 'g')")
+    connection.exec_driver_sql("INSERT INTO endpoint VALUES (1, 1, 'a', 'GET'), (2, 1, 'a', 'GET')")
+
+    with pytest.raises(RuntimeError) as error:
+        upgrade(connection, migration)
+    assert "(1, 'g', 2)" in str(error.value)
+    assert "(1, 'a', 'GET', 2)" in str(error.value)
+    assert not inspect(connection).get_indexes("group")
+
+
+def test_lookup_indexes_created_without_duplicates(connection):
+    migration = load_migration("2ad5a97b95fb_add_lookup_indexes")
+    connection.exec_driver_sql("INSERT INTO \"group\" VALUES (1, 1, 'g'), (2, 1, 'h')")
+
+    upgrade(connection, migration)
+    indexes = {index["name"]: index for index in inspect(connection).get_indexes("endpoint")}
+    assert indexes["ix_endpoint_group_id_path_method"]["unique"]
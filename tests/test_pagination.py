@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import OperationFailure
+from starlette.datastructures import URL, QueryParams
+from starlette.requests import Request
+
+from src.config import MOCK_PAGE_MAX_LIMIT, MOCK_PAGE_SIZE
+from src.mocks.pagination import Window, apply_window, pagination_headers, parse_window, window_pipeline
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL", "")
+
+
+def window(query):
+    return parse_window(QueryParams(query))
+
+
+def test_parse_window():
+    assert window("other=1") is None
+    assert window("_page=3&_limit=10") == Window(offset=20, limit=10, page=3)
+    assert window("_page=2") == Window(offset=MOCK_PAGE_SIZE, limit=MOCK_PAGE_SIZE, page=2)
+    assert window("_offset=5&_page=9&_limit=2") == Window(offset=5, limit=2)
+    assert window(f"_limit={MOCK_PAGE_MAX_LIMIT + 1}").limit == MOCK_PAGE_MAX_LIMIT
+    assert window("_fields=id, name,,") == Window(fields=("id", "name"))
+
+
+@pytest.mark.parametrize("query", ["_page=0", "_limit=abc", "_offset=-1"])
+def test_parse_window_rejects_bad_numbers(query):
+    with pytest.raises(HTTPException) as error:
+        window(query)
+    assert error.value.status_code == 400
+
+
+def test_apply_window():
+    data = [{"id": i, "name": str(i)} for i in range(5)]
+    assert apply_window(data, Window(offset=1, limit=2, fields=("id",))) == ([{"id": 1}, {"id": 2}], 5)
+    assert apply_window({"id": 1, "x": 2}, Window(fields=("id",))) == ({"id": 1}, None)
+
+
+WINDOWS = [Window(), Window(offset=2, limit=3), Window(offset=8, limit=5), Window(offset=20, limit=1),
+           Window(offset=1, limit=2, fields=("id", "missing")), Window(fields=("name",))]
+DOCUMENTS = {
+    "array": [{"id": i, "name": str(i), "extra": [i]} for i in range(10)],
+    "scalars": [1, "two", None, {"id": 4}],
+    "object": {"id": 1, "name": "x", "extra": True},
+    "number": 5,
+}
+
+
+async def aggregate_windows():
+    from pymongo import AsyncMongoClient
+
+    client = AsyncMongoClient(TEST_MONGO_URL)
+    collection = client.get_default_database("test")[f"window_{uuid.uuid4().hex}"]
+    try:
+        await collection.insert_many([{"_id": key, "data": data} for key, data in DOCUMENTS.items()])
+        result = {}
+        for key in DOCUMENTS:
+            for window in WINDOWS:
+                cursor = await collection.aggregate(window_pipeline({"_id": key}, window))
+                result[key, window] = (await cursor.to_list())[0]
+        return result
+    finally:
+        await collection.drop()
+        await client.close()
+
+
+@pytest.mark.skipif(not TEST_MONGO_URL.startswith("mongodb"), reason="TEST_MONGO_URL с MongoDB не задан")
+def test_window_pipeline_matches_apply_window():
+    # Окно, вырезанное агрегацией в MongoDB, должно совпадать с окном, посчитанным в Python
+    for (key, window), document in asyncio.run(aggregate_windows()).items():
+        assert (document["data"], document["total"]) == apply_window(DOCUMENTS[key], window), (key, window)
+
+
+class FailingAggregation:
+    """Менеджер MongoDB, у которого агрегация падает, а обычное чтение работает"""
+
+    async def aggregate_one(self, collection, pipeline):
+        raise OperationFailure("Unrecognized expression")
+
+    async def find(self, collection, query, projection=None, sort=None, limit=0):
+        return [{"data": DOCUMENTS["array"]}] if query == {"_id": "key"} else []
+
+
+def render_window(key, window):
+    from src.mocks.router import _render_window
+
+    request = Request({"type": "http", "method": "GET", "path": "/api/u/g/a", "query_string": b"",
+                       "headers": [], "scheme": "http", "server": ("t", 80)})
+    return asyncio.run(_render_window(request, FailingAggregation(), "u", 1, window, key))
+
+
+def test_render_window_falls_back_when_aggregation_fails():
+    response = render_window("key", Window(offset=2, limit=2, fields=("id",)))
+    assert response.status_code == 200
+    assert json.loads(response.body) == [{"id": 2}, {"id": 3}]
+    assert response.headers["X-Total-Count"] == "10"
+
+    with pytest.raises(HTTPException) as error:
+        render_window("other", Window(limit=1))
+    assert error.value.status_code == 404
+
+
+def links(headers):
+    return {rel.split('"')[1]: url.strip(" <>") for url, rel in
+            (link.split(";") for link in headers["Link"].split(", "))}
+
+
+def test_pagination_headers_by_offset():
+    headers = pagination_headers(URL("http://t/api/u/g/a?_offset=10&_limit=10"), Window(offset=10, limit=10), 25)
+    assert headers["X-Total-Count"] == "25"
+    assert links(headers) == {
+        "first": "http://t/api/u/g/a?_offset=0&_limit=10",
+        "prev": "http://t/api/u/g/a?_offset=0&_limit=10",
+        "next": "http://t/api/u/g/a?_offset=20&_limit=10",
+        "last": "http://t/api/u/g/a?_offset=20&_limit=10",
+    }
+
+
+def test_pagination_headers_by_page():
+    headers = pagination_headers(URL("http://t/a?_page=1&_limit=10"), Window(offset=0, limit=10, page=1), 10)
+    assert links(headers) == {"first": "http://t/a?_page=1&_limit=10", "last": "http://t/a?_page=1&_limit=10"}
+
+
+def test_pagination_headers_without_limit_or_array():
+    assert pagination_headers(URL("http://t/a"), Window(), 3) == {"X-Total-Count": "3"}
+    assert pagination_headers(URL("http://t/a"), Window(limit=1), None) == {}
@@ -0,0 +1,43 @@
+import asyncio
+
+from bson import ObjectId
+
+from src.mocks import payloads
+from src.mocks.payloads import serialize, store_payloads
+
+
+class Mongo:
+    """PAYLOADS_COLLECTION, из которой тело удалили после того, как find его увидел"""
+
+    def __init__(self, stale_keys):
+        self.stale_keys = stale_keys
+        self.operations = []
+
+    async def find(self, collection, query, projection=None, sort=None, limit=0):
+        return [{"_id": key} for key in self.stale_keys]
+
+    async def update_one(self, collection, query, update, upsert=False):
+        return False
+
+    async def upload_file(self, filename, data, metadata=None):
+        return ObjectId()
+
+    async def bulk_write(self, collection, operations):
+        self.operations.extend(operations)
+        return True
+
+
+def test_deleted_gridfs_payload_is_recreated_with_its_file(monkeypatch):
+    monkeypatch.setattr(payloads, "MOCK_GRIDFS_THRESHOLD", 8)
+    data = list(range(100))
+    key = payloads._payload_key(serialize(data))
+    mongo = Mongo([key])
+
+    documents = asyncio.run(store_payloads(mongo, [{"endpoint_id": 1, "data": data}]))
+
+    assert documents == [{"endpoint_id": 1, "payload": key}]
+    [operation] = mongo.operations
+    update = operation._doc
+    assert update["$inc"] == {"refs": 1}
+    # Документ, созданный upsert, не может остаться без тела
+    assert update["$setOnInsert"]["gridfs_id"] is not None
@@ -0,0 +1,75 @@
+import asyncio
+
+from fastapi import HTTPException
+
+from src.mocks import ratelimit
+from src.mocks.ratelimit import RateLimiter, TokenBucket
+from src.mocks.trie import RouteTrie
+
+
+def make_bucket(rate, burst):
+    bucket = TokenBucket(rate, burst)
+    bucket.updated_at = 0.0
+    return bucket
+
+
+def test_burst_then_retry_after():
+    bucket = make_bucket(2, 3)
+    assert [bucket.take(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take(0.0) == 0.5
+
+
+def test_refill_is_capped_by_burst():
+    bucket = make_bucket(2, 3)
+    for _ in range(3):
+        bucket.take(0.0)
+    assert bucket.take(0.5) == 0.0
+    assert bucket.take(0.5) == 0.5
+
+    assert [bucket.take(100.0) for _ in range(4)] == [0.0, 0.0, 0.0, 0.5]
+
+
+def test_zero_rate_is_unlimited():
+    bucket = make_bucket(0, 0)
+    assert all(bucket.take(0.0) == 0.0 for _ in range(100))
+
+
+def test_burst_is_at_least_one():
+    bucket = make_bucket(1, 0)
+    assert bucket.take(0.0) == 0.0
+    assert bucket.take(0.0) == 1.0
+
+
+class RoutingTable:
+    """Таблица маршрутов с одним существующим пользователем; считает загрузки"""
+
+    def __init__(self):
+        self.loads = []
+
+    async def get_many(self, session, usernames):
+        self.loads.append(list(usernames))
+        return {username: RouteTrie(None) for username in usernames if username == "u"}
+
+
+def test_check_limits_known_user_from_the_first_request(monkeypatch):
+    table = RoutingTable()
+    monkeypatch.setattr(ratelimit, "routing_table", table)
+    limiter = RateLimiter(1, 2, {}, 10, 60)
+
+    async def statuses(username, count):
+        result = []
+        for _ in range(count):
+            try:
+                await limiter.check(None, username)
+                result.append(200)
+            except HTTPException as e:
+                result.append(e.status_code)
+        return result
+
+    # Корзина заводится до разрешения маршрута: токены тратит и первый всплеск
+    assert asyncio.run(statuses("u", 3)) == [200, 200, 429]
+    # Для несуществующего пользователя корзины нет, лимит не применяется
+    assert asyncio.run(statuses("nobody", 3)) == [200, 200, 200]
+    assert "nobody" not in limiter._buckets
+    # Права известного пользователя загружаются один раз на время жизни корзины
+    assert table.loads.count(["u"]) == 1
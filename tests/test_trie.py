@@ -0,0 +1,73 @@
+import pytest
+
+from src.mocks.trie import MethodNotAllowed, RouteTrie, split_path
+
+
+def make_trie():
+    trie = RouteTrie()
+    trie.insert("g", "users", "GET", 1)
+    trie.insert("g", "users/{id}", "GET", 2)
+    trie.insert("g", "users/me", "GET", 3)
+    trie.insert("g", "users/{id}", "delete", 4)
+    trie.insert("g", "files/*", "GET", 5)
+    trie.insert("g", "users/{id}/posts", "GET", 6)
+    return trie
+
+
+def match(trie, path, method="GET", group="g"):
+    found = trie.match(group, split_path(path), method)
+    return found and (found.endpoint_id, found.pattern)
+
+
+def test_split_path():
+    assert split_path("/a//b/") == ["a", "b"]
+    assert split_path("") == []
+
+
+def test_literal_param_and_wildcard():
+    trie = make_trie()
+    assert len(trie) == 6
+    assert match(trie, "users") == (1, "users")
+    assert match(trie, "users/42") == (2, "users/{id}")
+    assert match(trie, "users/me") == (3, "users/me")
+    assert match(trie, "users/42", "delete") == (4, "users/{id}")
+    assert match(trie, "files/a/b/c") == (5, "files/*")
+    assert match(trie, "missing") is None
+    assert match(trie, "users", group="other") is None
+
+
+def test_backtracks_from_literal_to_param():
+    # users/me/posts: у литерала me нет posts, совпадение находится через {id}
+    assert match(make_trie(), "users/me/posts") == (6, "users/{id}/posts")
+
+
+def test_method_not_allowed_lists_methods_of_path():
+    trie = make_trie()
+    with pytest.raises(MethodNotAllowed) as error:
+        trie.match("g", ["users", "42"], "POST")
+    assert error.value.allowed == ["DELETE", "GET"]
+
+    with pytest.raises(MethodNotAllowed) as error:
+        trie.match("g", ["files", "a"], "PUT")
+    assert error.value.allowed == ["GET"]
+
+
+def test_remove_prunes_routes():
+    trie = make_trie()
+    assert trie.remove(3)
+    assert match(trie, "users/me") == (2, "users/{id}")
+    assert not trie.remove(3)
+
+    for endpoint_id in (2, 4, 6):
+        trie.remove(endpoint_id)
+    assert match(trie, "users/42") is None
+    assert match(trie, "users") == (1, "users")
+    assert len(trie) == 2
+
+
+def test_insert_same_endpoint_moves_route():
+    trie = make_trie()
+    trie.insert("g", "accounts", "GET", 1)
+    assert match(trie, "users") is None
+    assert match(trie, "accounts") == (1, "accounts")
+    assert len(trie) == 6